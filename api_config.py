@@ -1,29 +1,126 @@
+from nba_api.stats.library.http import NBAStatsHTTP
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
+from collections import defaultdict
 import requests
 from functools import lru_cache
+import threading
+import time
+import os
+
+# stats.nba.com throttles aggressive clients, so concurrent fetchers share one limit
+RATE_LIMIT = float(os.getenv("NBA_API_RATE_LIMIT", "4"))  # requests per second
+MAX_WORKERS = int(os.getenv("NBA_API_MAX_WORKERS", "4"))
+
+# Per-endpoint request timeouts in seconds (nba_api ignores session.timeout)
+DEFAULT_TIMEOUT = 60
+ENDPOINT_TIMEOUTS = {
+    'scoreboardv2': 30,
+    'boxscoretraditionalv2': 30,
+    'boxscoresummaryv2': 30,
+    'teamestimatedmetrics': 30,
+    'teamgamelog': 30,
+    'leaguegamefinder': 60,
+    'commonallplayers': 60
+}
+
+# Latency and retry counters per endpoint
+_stats_lock = threading.Lock()
+_endpoint_stats = defaultdict(lambda: {'calls': 0, 'errors': 0, 'retries': 0, 'seconds': 0.0})
+
+class CountingRetry(Retry):
+    """Retry strategy that records every retry against the endpoint being called"""
+
+    def increment(self, method=None, url=None, *args, **kwargs):
+        endpoint = url.split('?')[0].rstrip('/').rsplit('/', 1)[-1] if url else 'unknown'
+        with _stats_lock:
+            _endpoint_stats[endpoint]['retries'] += 1
+        return super().increment(method, url, *args, **kwargs)
 
 # Configure retry strategy
-retry_strategy = Retry(
+retry_strategy = CountingRetry(
     total=3,
     backoff_factor=1,
     status_forcelist=[429, 500, 502, 503, 504]
 )
 
-# Create session with retry strategy
+# Create session with retry strategy, keeping enough pooled keep-alive
+# connections for every concurrent worker
 nba_session = requests.Session()
-adapter = HTTPAdapter(max_retries=retry_strategy)
+adapter = HTTPAdapter(
+    max_retries=retry_strategy,
+    pool_connections=4,
+    pool_maxsize=max(10, MAX_WORKERS * 2)
+)
 nba_session.mount("http://", adapter)
 nba_session.mount("https://", adapter)
 
 # Configure session
-nba_session.timeout = 60
+nba_session.timeout = DEFAULT_TIMEOUT
 nba_session.headers.update({
     'User-Agent': 'Mozilla/5.0',
     'Accept': 'application/json'
 })
 
+# Every nba_api endpoint sends its requests through the shared session
+NBAStatsHTTP.set_session(nba_session)
+
 # Cache session getter
 @lru_cache(maxsize=1)
 def get_session():
-    return nba_session
\ No newline at end of file
+    return nba_session
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+rate_limiter = TokenBucket(RATE_LIMIT)
+
+def call_endpoint(endpoint_cls, **params):
+    """Call an nba_api endpoint through the shared session, rate limiter and per-endpoint timeout"""
+    name = endpoint_cls.endpoint
+    params.setdefault('timeout', ENDPOINT_TIMEOUTS.get(name, DEFAULT_TIMEOUT))
+
+    rate_limiter.acquire()
+    started = time.perf_counter()
+    try:
+        return endpoint_cls(**params)
+    except Exception:
+        with _stats_lock:
+            _endpoint_stats[name]['errors'] += 1
+        raise
+    finally:
+        with _stats_lock:
+            _endpoint_stats[name]['calls'] += 1
+            _endpoint_stats[name]['seconds'] += time.perf_counter() - started
+
+def get_api_stats():
+    """Get a copy of the per-endpoint call, error, retry and latency counters"""
+    with _stats_lock:
+        return {name: dict(stats) for name, stats in _endpoint_stats.items()}
+
+def print_api_stats():
+    """Print a per-endpoint summary of API usage"""
+    for name, stats in sorted(get_api_stats().items()):
+        avg = stats['seconds'] / stats['calls'] if stats['calls'] else 0.0
+        print(f"{name}: {stats['calls']} calls, {stats['errors']} errors, "
+              f"{stats['retries']} retries, avg {avg:.2f}s")
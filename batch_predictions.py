@@ -0,0 +1,162 @@
+import psycopg2
+from psycopg2 import Error
+from psycopg2.extras import execute_values
+import os
+from dotenv import load_dotenv
+import pandas as pd
+from datetime import datetime, timedelta
+import argparse
+import time
+from team_index import get_team_name
+from serving_features import refresh_serving_features, load_serving_features
+from matchup_stats import create_matchup_stats_table, rebuild_matchup_stats
+from prediction_store import init_store, save_predictions
+from predictor import predict_slate
+
+UPCOMING_GAMES_QUERY = '''
+SELECT game_id, game_date, game_time, home_team_id, away_team_id
+FROM upcoming_games
+WHERE game_date BETWEEN %s AND %s
+ORDER BY game_date, game_time, game_id;
+'''
+
+STORED_PREDICTIONS_QUERY = '''
+SELECT ug.game_id, ug.game_date, ug.game_time, ug.home_team_id, ug.away_team_id,
+       gp.predicted_winner_id, gp.win_probability, gp.predicted_total_points
+FROM game_predictions gp
+JOIN upcoming_games ug ON ug.game_id = gp.game_id
+WHERE ug.game_date BETWEEN %s AND %s
+ORDER BY ug.game_date, ug.game_time, ug.game_id;
+'''
+
+def get_connection():
+    load_dotenv()
+    return psycopg2.connect(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        database="nba_stats"
+    )
+
+def game_datetime(game_date, game_time):
+    return datetime.combine(game_date, game_time) if game_time is not None else pd.to_datetime(game_date)
+
+def load_upcoming_games(cursor, days):
+    """Read the next days of scheduled games from upcoming_games"""
+    today = datetime.now().date()
+    cursor.execute(UPCOMING_GAMES_QUERY, (today, today + timedelta(days=days - 1)))
+
+    return [
+        {
+            'game_id': game_id,
+            'date': game_datetime(game_date, game_time),
+            'home_team': get_team_name(home_team_id),
+            'away_team': get_team_name(away_team_id),
+            'home_team_id': home_team_id,
+            'away_team_id': away_team_id
+        }
+        for game_id, game_date, game_time, home_team_id, away_team_id in cursor.fetchall()
+    ]
+
+def upsert_game_predictions(cursor, games, predictions):
+    """Bulk upsert one game_predictions row per game"""
+    prediction_date = datetime.now()
+    rows = [
+        (
+            str(game['game_id']),
+            pred['winner_id'],
+            # Stored as a probability; the views format it as a percentage
+            round(pred['win_probability'] / 100, 4),
+            round(pred['total_points'], 1),
+            prediction_date
+        )
+        for game, pred in zip(games, predictions)
+    ]
+
+    execute_values(cursor, '''
+    INSERT INTO game_predictions
+    (game_id, predicted_winner_id, win_probability, predicted_total_points, prediction_date)
+    VALUES %s
+    ON CONFLICT (game_id) DO UPDATE
+    SET predicted_winner_id = EXCLUDED.predicted_winner_id,
+        win_probability = EXCLUDED.win_probability,
+        predicted_total_points = EXCLUDED.predicted_total_points,
+        prediction_date = EXCLUDED.prediction_date;
+    ''', rows)
+
+def run_batch_predictions(days=3):
+    """Score every upcoming game in one pass and store the results in game_predictions"""
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+
+        games = load_upcoming_games(cursor, days)
+        if not games:
+            print("No upcoming games to score")
+            connection.commit()
+            return
+
+        # Aggregates are rebuilt first so tonight's finals are reflected
+        create_matchup_stats_table(cursor)
+        rebuild_matchup_stats(cursor)
+        refresh_serving_features(cursor)
+        connection.commit()
+
+        started = time.perf_counter()
+        predictions = predict_slate(games, load_serving_features())
+        upsert_game_predictions(cursor, games, predictions)
+        connection.commit()
+        print(f"Scored {len(games)} games in {time.perf_counter() - started:.2f}s")
+
+        # Keep the history page fed with the same predictions
+        init_store()
+        save_predictions(games, predictions)
+
+    except (Exception, Error) as error:
+        print(f"Error: {error}")
+        if connection:
+            connection.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+def get_stored_predictions(days=3):
+    """Read precomputed predictions for the next days, formatted for the index view"""
+    connection = None
+    try:
+        connection = get_connection()
+        with connection.cursor() as cursor:
+            today = datetime.now().date()
+            cursor.execute(STORED_PREDICTIONS_QUERY, (today, today + timedelta(days=days - 1)))
+            rows = cursor.fetchall()
+    except (Exception, Error) as error:
+        print(f"Error reading stored predictions: {error}")
+        return []
+    finally:
+        if connection:
+            connection.close()
+
+    return [
+        {
+            'date': game_datetime(game_date, game_time),
+            'home_team': get_team_name(home_team_id),
+            'away_team': get_team_name(away_team_id),
+            'predicted_winner': get_team_name(winner_id),
+            'win_probability': f"{win_probability * 100:.1f}%",
+            'predicted_total': round(total_points, 1)
+        }
+        for (game_id, game_date, game_time, home_team_id, away_team_id,
+             winner_id, win_probability, total_points) in rows
+    ]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score upcoming games into game_predictions")
+    parser.add_argument("--days", type=int, default=3,
+                        help="number of days of upcoming games to score, starting today")
+    args = parser.parse_args()
+    run_batch_predictions(days=args.days)
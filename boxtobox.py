@@ -1,10 +1,18 @@
 from nba_api.stats.endpoints import leaguegamefinder, boxscoresummaryv2
 import psycopg2
 from psycopg2 import Error
+from psycopg2.extras import execute_values
 import os
 from dotenv import load_dotenv
 import pandas as pd
 from datetime import datetime
+from team_index import get_valid_team_ids
+from api_config import call_endpoint, print_api_stats
+from schema_migrations import ensure_season_partitions
+from matchup_stats import create_matchup_stats_table, update_matchups
+import argparse
+
+DEFAULT_SEASON = "2024-25"
 
 def get_game_details(game_df, valid_team_ids):
     """Helper function to process game data with team ID validation"""
@@ -35,7 +43,32 @@ def get_game_details(game_df, valid_team_ids):
         game_list.append(game_dict)
     return game_list
 
-def create_games_table():
+def upsert_games(cursor, games_list, season, page_size=1000):
+    """Upsert a list of games with a single execute_values statement"""
+    insert_query = '''
+    INSERT INTO games 
+    (game_id, game_date, home_team_id, away_team_id, 
+     home_team_score, away_team_score, season)
+    VALUES %s
+    ON CONFLICT (game_id) DO UPDATE 
+    SET home_team_score = EXCLUDED.home_team_score,
+        away_team_score = EXCLUDED.away_team_score;
+    '''
+    execute_values(cursor, insert_query, [
+        (
+            game['game_id'],
+            game['game_date'],
+            int(game['home_team_id']),
+            int(game['away_team_id']),
+            int(game['home_team_score']),
+            int(game['away_team_score']),
+            season
+        )
+        for game in games_list
+    ], page_size=page_size)
+
+def create_games_table(seasons=(DEFAULT_SEASON,), chunk_size=None):
+    """Load every game of the given seasons, committing once per season (or per chunk)"""
     connection = None
     cursor = None
     try:
@@ -50,16 +83,8 @@ def create_games_table():
         )
         cursor = connection.cursor()
         
-        # Get valid team IDs from database
-        cursor.execute("SELECT team_id FROM teams")
-        valid_team_ids = {row[0] for row in cursor.fetchall()}
-        
-        # Get games
-        gamefinder = leaguegamefinder.LeagueGameFinder(
-            season_nullable="2024-25",
-            league_id_nullable="00"
-        )
-        games_df = gamefinder.get_data_frames()[0]
+        # Valid team IDs come from the shared static team index
+        valid_team_ids = get_valid_team_ids()
         
         # Create table if not exists
         create_table_query = '''
@@ -76,31 +101,33 @@ def create_games_table():
         );
         '''
         cursor.execute(create_table_query)
+        # Head-to-head records read by step_2 and the serving snapshot
+        create_matchup_stats_table(cursor)
+        connection.commit()
         
-        # Process only games with valid team IDs
-        games_list = get_game_details(games_df, valid_team_ids)
-        
-        for game in games_list:
-            insert_query = '''
-            INSERT INTO games 
-            (game_id, game_date, home_team_id, away_team_id, 
-             home_team_score, away_team_score, season)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (game_id) DO UPDATE 
-            SET home_team_score = EXCLUDED.home_team_score,
-                away_team_score = EXCLUDED.away_team_score;
-            '''
-            cursor.execute(insert_query, (
-                game['game_id'],
-                game['game_date'],
-                game['home_team_id'],
-                game['away_team_id'],
-                game['home_team_score'],
-                game['away_team_score'],
-                "2024-25"
-            ))
-            connection.commit()
-            print(f"Game {game['game_id']} saved successfully")
+        for season in seasons:
+            # Get games
+            gamefinder = call_endpoint(
+                leaguegamefinder.LeagueGameFinder,
+                season_nullable=season,
+                league_id_nullable="00"
+            )
+            games_df = gamefinder.get_data_frames()[0]
+            
+            # Process only games with valid team IDs
+            games_list = get_game_details(games_df, valid_team_ids)
+            step = chunk_size or max(len(games_list), 1)
+            # New seasons need their partitions before the first insert
+            ensure_season_partitions(cursor, [season])
+            
+            for start in range(0, len(games_list), step):
+                chunk = games_list[start:start + step]
+                upsert_games(cursor, chunk, season)
+                # Pairings are recomputed in the same transaction as their games
+                update_matchups(cursor, [(game['home_team_id'], game['away_team_id']) for game in chunk])
+                connection.commit()
+            
+            print(f"{len(games_list)} games saved successfully for season {season}")
 
     except (Exception, Error) as error:
         print(f"Error: {error}")
@@ -113,4 +140,11 @@ def create_games_table():
             connection.close()
 
 if __name__ == "__main__":
-    create_games_table()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load season games into the games table")
+    parser.add_argument("--season", action="append", dest="seasons",
+                        help=f"season to load, e.g. 2023-24 (repeatable, default {DEFAULT_SEASON})")
+    parser.add_argument("--chunk-size", type=int, default=None,
+                        help="commit every N games instead of once per season")
+    args = parser.parse_args()
+    create_games_table(seasons=args.seasons or [DEFAULT_SEASON], chunk_size=args.chunk_size)
+    print_api_stats()
\ No newline at end of file
@@ -0,0 +1,105 @@
+import psycopg2
+from psycopg2 import Error
+import os
+from dotenv import load_dotenv
+import argparse
+import time
+
+# Head-to-head record of every (home, away) pairing, recomputed from games.
+# {pair_filter} limits it to the pairings touched by an incremental update.
+MATCHUP_QUERY = '''
+INSERT INTO matchup_stats
+(home_team_id, away_team_id, games_played, home_wins,
+total_point_diff, last_game_date, updated_at)
+SELECT
+    home_team_id,
+    away_team_id,
+    COUNT(*),
+    SUM(CASE WHEN home_team_score > away_team_score THEN 1 ELSE 0 END),
+    SUM(home_team_score - away_team_score),
+    MAX(game_date),
+    CURRENT_TIMESTAMP
+FROM games
+WHERE home_team_score IS NOT NULL {pair_filter}
+GROUP BY home_team_id, away_team_id
+ON CONFLICT (home_team_id, away_team_id) DO UPDATE
+SET games_played = EXCLUDED.games_played,
+    home_wins = EXCLUDED.home_wins,
+    total_point_diff = EXCLUDED.total_point_diff,
+    last_game_date = EXCLUDED.last_game_date,
+    updated_at = EXCLUDED.updated_at;
+'''
+
+def create_matchup_stats_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS matchup_stats (
+        home_team_id INTEGER REFERENCES teams(team_id),
+        away_team_id INTEGER REFERENCES teams(team_id),
+        games_played INTEGER NOT NULL,
+        home_wins INTEGER NOT NULL,
+        total_point_diff INTEGER NOT NULL,
+        last_game_date DATE,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (home_team_id, away_team_id)
+    );
+
+    -- Serves the per-pairing recompute below
+    CREATE INDEX IF NOT EXISTS idx_games_matchup ON games (home_team_id, away_team_id);
+    ''')
+
+def update_matchups(cursor, pairs):
+    """Recompute a batch of (home_team_id, away_team_id) pairings in one statement;
+    safe to repeat for the same games"""
+    pairs = sorted({(int(home), int(away)) for home, away in pairs})
+    if not pairs:
+        return 0
+    cursor.execute(
+        MATCHUP_QUERY.format(pair_filter=(
+            "AND (home_team_id, away_team_id) IN "
+            "(SELECT * FROM unnest(%(homes)s::integer[], %(aways)s::integer[]))"
+        )),
+        {'homes': [home for home, _ in pairs], 'aways': [away for _, away in pairs]}
+    )
+    return cursor.rowcount
+
+def update_matchup(cursor, home_team_id, away_team_id):
+    """Recompute one pairing after a final is written"""
+    return update_matchups(cursor, [(home_team_id, away_team_id)])
+
+def rebuild_matchup_stats(cursor):
+    """Recompute every pairing from the full games table"""
+    cursor.execute(MATCHUP_QUERY.format(pair_filter=""))
+    return cursor.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild the head-to-head matchup_stats table from games")
+    parser.parse_args()
+
+    connection = None
+    cursor = None
+    try:
+        load_dotenv()
+        connection = psycopg2.connect(
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            host=os.getenv("DB_HOST", "localhost"),
+            port=os.getenv("DB_PORT", "5432"),
+            database="nba_stats"
+        )
+        cursor = connection.cursor()
+
+        started = time.perf_counter()
+        create_matchup_stats_table(cursor)
+        rows = rebuild_matchup_stats(cursor)
+        connection.commit()
+        print(f"Rebuilt {rows} matchup_stats rows in {time.perf_counter() - started:.2f}s")
+
+    except (Exception, Error) as error:
+        print(f"Error: {error}")
+        if connection:
+            connection.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
@@ -44,11 +44,11 @@ def create_prediction_tables():
         create_predictions_query = '''
         CREATE TABLE IF NOT EXISTS game_predictions (
             id SERIAL PRIMARY KEY,
-            game_id VARCHAR(20) REFERENCES games(game_id),
+            game_id VARCHAR(20),
             predicted_winner_id INTEGER REFERENCES teams(team_id),
             predicted_home_score INTEGER,
             predicted_away_score INTEGER,
-            predicted_total_points INTEGER,
+            predicted_total_points FLOAT,
             win_probability FLOAT,
             prediction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             actual_winner_id INTEGER REFERENCES teams(team_id),
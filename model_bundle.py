@@ -0,0 +1,129 @@
+from functools import lru_cache
+import xgboost as xgb
+import numpy as np
+import json
+import os
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+BUNDLE_DIR = os.path.join(MODELS_DIR, 'inference')
+JOBLIB_PATH = os.path.join(MODELS_DIR, 'nba_prediction_models.joblib')
+
+BUNDLE_VERSION = 1
+
+def export_inference_bundle(winner_model, winner_calibrator, total_model, scaler, feature_columns,
+                            bundle_dir=BUNDLE_DIR, metadata=None):
+    """Write the slim inference bundle: native UBJ boosters trimmed to their best
+    iteration, scaler and calibration arrays, and the feature list"""
+    os.makedirs(bundle_dir, exist_ok=True)
+
+    for name, model in (('winner', winner_model), ('total', total_model)):
+        booster = model.get_booster()
+        best_iteration = getattr(model, 'best_iteration', None)
+        if best_iteration is not None:
+            # Only keep the trees prediction actually uses
+            booster = booster[:best_iteration + 1]
+        booster.save_model(os.path.join(bundle_dir, f"{name}.ubj"))
+
+    arrays = {
+        'scaler_mean': scaler.mean_.astype(np.float32),
+        'scaler_scale': scaler.scale_.astype(np.float32)
+    }
+    if winner_calibrator is not None:
+        arrays['calibrator_x'] = winner_calibrator.X_thresholds_.astype(np.float32)
+        arrays['calibrator_y'] = winner_calibrator.y_thresholds_.astype(np.float32)
+    np.savez(os.path.join(bundle_dir, 'arrays.npz'), **arrays)
+
+    # Written last: a bundle without bundle.json is never loaded
+    with open(os.path.join(bundle_dir, 'bundle.json'), 'w') as f:
+        json.dump({
+            'version': BUNDLE_VERSION,
+            'feature_columns': list(feature_columns),
+            **(metadata or {})
+        }, f, indent=2, default=str)
+
+class InferenceBundle:
+    """Native XGBoost boosters plus NumPy scaler/calibration arrays"""
+
+    def __init__(self, bundle_dir=BUNDLE_DIR):
+        with open(os.path.join(bundle_dir, 'bundle.json')) as f:
+            meta = json.load(f)
+        self.feature_columns = meta['feature_columns']
+
+        with np.load(os.path.join(bundle_dir, 'arrays.npz')) as arrays:
+            self.scaler_mean = arrays['scaler_mean']
+            self.scaler_scale = arrays['scaler_scale']
+            self.calibrator_x = arrays['calibrator_x'] if 'calibrator_x' in arrays else None
+            self.calibrator_y = arrays['calibrator_y'] if 'calibrator_y' in arrays else None
+
+        self.winner_booster = xgb.Booster(model_file=os.path.join(bundle_dir, 'winner.ubj'))
+        self.total_booster = xgb.Booster(model_file=os.path.join(bundle_dir, 'total.ubj'))
+
+    def scale(self, features):
+        return (np.asarray(features, dtype=np.float32) - self.scaler_mean) / self.scaler_scale
+
+    def predict_home_win_probability(self, features_scaled):
+        """Calibrated home win probabilities for a batch of scaled feature rows"""
+        win_probs = self.winner_booster.inplace_predict(features_scaled)
+        if self.calibrator_x is not None:
+            # Same piecewise-linear, clipped mapping as IsotonicRegression.predict
+            win_probs = np.interp(win_probs, self.calibrator_x, self.calibrator_y)
+        return win_probs
+
+    def predict_total(self, features_scaled):
+        return self.total_booster.inplace_predict(features_scaled)
+
+class JoblibBundle:
+    """Fallback that serves the full joblib training artifact through the same interface"""
+
+    def __init__(self, path=JOBLIB_PATH):
+        # Imported here so serving from the slim bundle never pays for joblib/sklearn
+        import joblib
+
+        model_data = joblib.load(path)
+        self.winner_model = model_data['winner_model']
+        self.winner_calibrator = model_data.get('winner_calibrator')
+        self.total_model = model_data['total_model']
+        self.scaler = model_data['scaler']
+        self.feature_columns = model_data['feature_columns']
+        # float32 like the slim bundle, so both paths score identical inputs
+        self.scaler_mean = self.scaler.mean_.astype(np.float32)
+        self.scaler_scale = self.scaler.scale_.astype(np.float32)
+
+    def scale(self, features):
+        # Same transform as scaler.transform, without the per-call DataFrame checks
+        return (np.asarray(features, dtype=np.float32) - self.scaler_mean) / self.scaler_scale
+
+    def predict_home_win_probability(self, features_scaled):
+        """Home win probabilities for a batch of scaled feature rows"""
+        if hasattr(self.winner_model, 'predict_proba'):
+            win_probs = self.winner_model.predict_proba(features_scaled)[:, 1]
+            return self.winner_calibrator.predict(win_probs) if self.winner_calibrator is not None else win_probs
+        # Artifacts trained before the winner classifier hold a 0/1 regressor
+        return np.clip(self.winner_model.predict(features_scaled), 0, 1)
+
+    def predict_total(self, features_scaled):
+        return self.total_model.predict(features_scaled)
+
+def check_bundle_parity(features, bundle_dir=BUNDLE_DIR, joblib_path=JOBLIB_PATH):
+    """Largest absolute difference between the slim bundle and the joblib artifact
+    on the same unscaled feature rows, per output"""
+    bundle = InferenceBundle(bundle_dir)
+    fallback = JoblibBundle(joblib_path)
+    bundle_scaled = bundle.scale(features)
+    fallback_scaled = fallback.scale(features)
+    return {
+        'win_probability': float(np.max(np.abs(
+            bundle.predict_home_win_probability(bundle_scaled)
+            - fallback.predict_home_win_probability(fallback_scaled)
+        ))),
+        'total_points': float(np.max(np.abs(
+            bundle.predict_total(bundle_scaled) - fallback.predict_total(fallback_scaled)
+        )))
+    }
+
+@lru_cache(maxsize=1)
+def get_model_bundle():
+    """Load the inference bundle on first use, falling back to the joblib artifact"""
+    if os.path.exists(os.path.join(BUNDLE_DIR, 'bundle.json')):
+        return InferenceBundle(BUNDLE_DIR)
+    return JoblibBundle(JOBLIB_PATH)
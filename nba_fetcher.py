@@ -0,0 +1,124 @@
+from nba_api.stats.endpoints import boxscoretraditionalv2
+from nba_api.stats.library.http import NBAStatsResponse
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import hashlib
+import time
+import json
+import os
+from api_config import call_endpoint, MAX_WORKERS
+
+# Raw responses are stored as <CACHE_DIR>/<aa>/<sha256>.json
+CACHE_DIR = os.getenv(
+    "NBA_API_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'nba_api')
+)
+
+# Seconds a cached response is served before it is fetched again (unset: never expires)
+CACHE_MAX_AGE = float(os.getenv("NBA_API_CACHE_MAX_AGE", "0")) or None
+
+def cache_key(endpoint_cls, params):
+    """Content address for an endpoint call: sha256 of endpoint name + sorted params"""
+    payload = json.dumps({'endpoint': endpoint_cls.endpoint, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cache_path(key):
+    return os.path.join(CACHE_DIR, key[:2], f"{key}.json")
+
+def is_valid(endpoint, validate):
+    try:
+        return validate is None or bool(validate(endpoint))
+    except Exception:
+        return False
+
+def read_cached(endpoint_cls, path, params, max_age):
+    """Load a cached response, or None if there is none or it has expired"""
+    if not os.path.exists(path):
+        return None
+    if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+        return None
+    with open(path, encoding='utf-8') as f:
+        raw_response = f.read()
+    endpoint = endpoint_cls(get_request=False, **params)
+    endpoint.nba_response = NBAStatsResponse(response=raw_response, status_code=200, url=None)
+    endpoint.load_response()
+    return endpoint
+
+def fetch_endpoint(endpoint_cls, cache=True, refresh=False, validate=None, max_age=CACHE_MAX_AGE, **params):
+    """Call an nba_api endpoint, serving the raw response from the on-disk cache when present.
+
+    Only pass cache=True for data that should not change, such as box scores of
+    completed games. refresh skips the cached copy and replaces it. Responses
+    failing validate are neither cached nor served from the cache.
+    """
+    path = cache_path(cache_key(endpoint_cls, params))
+
+    if cache and not refresh:
+        try:
+            endpoint = read_cached(endpoint_cls, path, params, max_age)
+        except Exception as e:
+            print(f"Ignoring unreadable cache entry {path}: {e}")
+            endpoint = None
+        if endpoint is not None and is_valid(endpoint, validate):
+            return endpoint
+
+    endpoint = call_endpoint(endpoint_cls, **params)
+
+    if not is_valid(endpoint, validate):
+        # Never keep an empty or broken response; the next call tries the API again
+        if cache and os.path.exists(path):
+            os.remove(path)
+    elif cache:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file first so concurrent readers never see a partial file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(endpoint.nba_response.get_response())
+        os.replace(tmp_path, path)
+
+    return endpoint
+
+def fetch_many(endpoint_cls, params_list, cache=True, refresh=False, validate=None, max_workers=MAX_WORKERS):
+    """Fetch one endpoint for many parameter sets concurrently.
+
+    Returns endpoints in the same order as params_list, with None for calls that failed.
+    """
+    params_list = list(params_list)
+    if not params_list:
+        return []
+
+    def fetch(params):
+        try:
+            return fetch_endpoint(endpoint_cls, cache=cache, refresh=refresh, validate=validate, **params)
+        except Exception as e:
+            print(f"Error fetching {endpoint_cls.endpoint} {params}: {e}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(params_list))) as executor:
+        return list(executor.map(fetch, params_list))
+
+def has_player_stats(endpoint):
+    """A box score is usable once it has player rows"""
+    player_stats = endpoint.player_stats.get_data_frame()
+    return not player_stats.empty and 'PLAYER_ID' in player_stats.columns
+
+def fetch_box_scores(game_ids, cache=True, refresh=False, max_workers=MAX_WORKERS):
+    """Fetch BoxScoreTraditionalV2 player stats for completed games as {game_id: DataFrame}.
+
+    Games without player rows are left out and not cached. Pass refresh=True to
+    re-fetch games whose cached box score is known to be stale.
+    """
+    game_ids = list(game_ids)
+    endpoints = fetch_many(
+        boxscoretraditionalv2.BoxScoreTraditionalV2,
+        [{'game_id': game_id} for game_id in game_ids],
+        cache=cache,
+        refresh=refresh,
+        validate=has_player_stats,
+        max_workers=max_workers
+    )
+    return {
+        game_id: endpoint.player_stats.get_data_frame()
+        for game_id, endpoint in zip(game_ids, endpoints)
+        if endpoint is not None and is_valid(endpoint, has_player_stats)
+    }
@@ -1,9 +1,38 @@
-from nba_api.stats.endpoints import boxscoretraditionalv2
 import psycopg2
 from psycopg2 import Error
+from psycopg2.extras import execute_values
 import os
 from dotenv import load_dotenv
 import pandas as pd
+import argparse
+import time
+from nba_fetcher import fetch_box_scores
+from api_config import print_api_stats
+from team_game_stats import create_team_game_stats_table, update_team_game_stats
+
+# Games with no player rows yet, or whose player points no longer add up to the final score.
+# stale is true for the latter: their cached box score is outdated and must be re-fetched.
+PENDING_GAMES_QUERY = '''
+SELECT g.game_id, p.game_id IS NOT NULL AS stale
+FROM games g
+LEFT JOIN (
+    SELECT game_id, SUM(points) AS total_points
+    FROM player_game_stats
+    GROUP BY game_id
+) p ON p.game_id = g.game_id
+WHERE p.game_id IS NULL
+   OR p.total_points IS DISTINCT FROM g.home_team_score + g.away_team_score
+ORDER BY g.game_date, g.game_id;
+'''
+
+# Number of games whose box scores are staged and upserted together
+BATCH_SIZE = 25
+
+STAT_COLUMNS = [
+    'minutes', 'points', 'assists', 'rebounds', 'steals', 'blocks', 'turnovers',
+    'field_goals_made', 'field_goals_attempted', 'three_points_made',
+    'three_points_attempted', 'free_throws_made', 'free_throws_attempted', 'plus_minus'
+]
 
 def convert_minutes_to_int(minutes_str):
     """Convert minutes from various formats to integer minutes"""
@@ -29,8 +58,89 @@ def safe_int_convert(value, default=0):
     except:
         return default
 
-def create_player_game_stats_table():
-    """Create and populate player game statistics table"""
+def player_stats_rows(game_id, player_stats):
+    """Convert a box score player frame into staging rows"""
+    return [
+        (
+            game_id,
+            int(player['PLAYER_ID']),
+            player['PLAYER_NAME'],
+            int(player['TEAM_ID']),
+            convert_minutes_to_int(player['MIN']),
+            safe_int_convert(player['PTS']),
+            safe_int_convert(player['AST']),
+            safe_int_convert(player['REB']),
+            safe_int_convert(player['STL']),
+            safe_int_convert(player['BLK']),
+            safe_int_convert(player['TO']),
+            safe_int_convert(player['FGM']),
+            safe_int_convert(player['FGA']),
+            safe_int_convert(player['FG3M']),
+            safe_int_convert(player['FG3A']),
+            safe_int_convert(player['FTM']),
+            safe_int_convert(player['FTA']),
+            safe_int_convert(player['PLUS_MINUS'])
+        )
+        for player in player_stats.to_dict('records')
+    ]
+
+def bulk_load_player_stats(cursor, rows):
+    """Stage rows in a temp table, then upsert players and player_game_stats set-based"""
+    cursor.execute('''
+    CREATE TEMP TABLE IF NOT EXISTS player_game_stats_staging (
+        game_id VARCHAR(20),
+        player_id INTEGER,
+        player_name VARCHAR(100),
+        team_id INTEGER,
+        minutes INTEGER,
+        points INTEGER,
+        assists INTEGER,
+        rebounds INTEGER,
+        steals INTEGER,
+        blocks INTEGER,
+        turnovers INTEGER,
+        field_goals_made INTEGER,
+        field_goals_attempted INTEGER,
+        three_points_made INTEGER,
+        three_points_attempted INTEGER,
+        free_throws_made INTEGER,
+        free_throws_attempted INTEGER,
+        plus_minus INTEGER
+    ) ON COMMIT DELETE ROWS;
+    ''')
+
+    columns = ', '.join(STAT_COLUMNS)
+    execute_values(
+        cursor,
+        f"INSERT INTO player_game_stats_staging (game_id, player_id, player_name, team_id, {columns}) VALUES %s",
+        rows,
+        page_size=1000
+    )
+
+    # Insert players we have not seen yet with minimal info
+    cursor.execute('''
+    INSERT INTO players (player_id, full_name, is_active)
+    SELECT DISTINCT ON (player_id) player_id, player_name, TRUE
+    FROM player_game_stats_staging
+    ON CONFLICT (player_id) DO NOTHING;
+    ''')
+
+    updates = ',\n        '.join(f"{column} = EXCLUDED.{column}" for column in STAT_COLUMNS)
+    cursor.execute(f'''
+    INSERT INTO player_game_stats (game_id, player_id, team_id, {columns})
+    SELECT DISTINCT ON (game_id, player_id) game_id, player_id, team_id, {columns}
+    FROM player_game_stats_staging
+    ON CONFLICT (game_id, player_id) DO UPDATE
+    SET {updates};
+    ''')
+
+def create_player_game_stats_table(batch_size=BATCH_SIZE, full=False):
+    """Create and populate player game statistics table.
+
+    By default only games missing from player_game_stats (or whose scores changed)
+    are fetched. Every batch is committed on its own, so a crashed run resumes
+    where it stopped the next time it is started.
+    """
     connection = None
     cursor = None
     try:
@@ -73,70 +183,57 @@ def create_player_game_stats_table():
         );
         '''
         cursor.execute(create_table_query)
+        create_team_game_stats_table(cursor)
         connection.commit()
 
         # Get games from database
-        cursor.execute("SELECT game_id FROM games")
-        game_ids = [row[0] for row in cursor.fetchall()]
+        if full:
+            cursor.execute("SELECT game_id, FALSE FROM games ORDER BY game_date, game_id")
+        else:
+            cursor.execute(PENDING_GAMES_QUERY)
+        pending = cursor.fetchall()
+        game_ids = [game_id for game_id, _ in pending]
+        stale_game_ids = {game_id for game_id, stale in pending if stale}
         print(f"Found {len(game_ids)} games to process")
 
-        # Process each game
-        for game_id in game_ids:
+        started = time.perf_counter()
+        processed_games = 0
+        processed_rows = 0
+
+        # Process games in batches: fetch box scores, then one set-based load per batch
+        for start in range(0, len(game_ids), batch_size):
+            batch = game_ids[start:start + batch_size]
+            rows = []
+            loaded_games = []
+
+            # Box scores are fetched concurrently and cached on disk; stale games bypass the cache
+            box_scores = fetch_box_scores([game_id for game_id in batch if game_id not in stale_game_ids])
+            box_scores.update(fetch_box_scores([game_id for game_id in batch if game_id in stale_game_ids],
+                                               refresh=True))
+            for game_id, player_stats in box_scores.items():
+                rows.extend(player_stats_rows(game_id, player_stats))
+                loaded_games.append(game_id)
+
+            if not rows:
+                continue
+
             try:
-                box_score = boxscoretraditionalv2.BoxScoreTraditionalV2(game_id=game_id)
-                player_stats = box_score.player_stats.get_data_frame()
-
-                for _, player in player_stats.iterrows():
-                    # Check and insert player with minimal info
-                    cursor.execute("SELECT 1 FROM players WHERE player_id = %s", (int(player['PLAYER_ID']),))
-                    if not cursor.fetchone():
-                        cursor.execute(
-                            "INSERT INTO players (player_id, full_name, is_active) VALUES (%s, %s, %s)",
-                            (int(player['PLAYER_ID']), player['PLAYER_NAME'], True)
-                        )
-
-                    # Insert player stats
-                    insert_query = '''
-                    INSERT INTO player_game_stats 
-                    (game_id, player_id, team_id, minutes, points, assists, rebounds,
-                    steals, blocks, turnovers, field_goals_made, field_goals_attempted,
-                    three_points_made, three_points_attempted, free_throws_made,
-                    free_throws_attempted, plus_minus)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (game_id, player_id) DO UPDATE 
-                    SET minutes = EXCLUDED.minutes,
-                        points = EXCLUDED.points,
-                        assists = EXCLUDED.assists,
-                        rebounds = EXCLUDED.rebounds;
-                    '''
-
-                    cursor.execute(insert_query, (
-                        game_id,
-                        int(player['PLAYER_ID']),
-                        int(player['TEAM_ID']),
-                        convert_minutes_to_int(player['MIN']),
-                        safe_int_convert(player['PTS']),
-                        safe_int_convert(player['AST']),
-                        safe_int_convert(player['REB']),
-                        safe_int_convert(player['STL']),
-                        safe_int_convert(player['BLK']),
-                        safe_int_convert(player['TO']),
-                        safe_int_convert(player['FGM']),
-                        safe_int_convert(player['FGA']),
-                        safe_int_convert(player['FG3M']),
-                        safe_int_convert(player['FG3A']),
-                        safe_int_convert(player['FTM']),
-                        safe_int_convert(player['FTA']),
-                        safe_int_convert(player['PLUS_MINUS'])
-                    ))
-                
+                bulk_load_player_stats(cursor, rows)
+                update_team_game_stats(cursor, game_ids=loaded_games)
                 connection.commit()
-                print(f"Stats for game {game_id} saved successfully")
-
+                processed_games += len(loaded_games)
+                processed_rows += len(rows)
+                elapsed = time.perf_counter() - started
+                print(f"Stats for {len(loaded_games)} games ({len(rows)} rows) saved successfully - "
+                      f"{processed_games}/{len(game_ids)} games, {processed_games / elapsed:.2f} games/s")
             except Exception as e:
-                print(f"Error processing game {game_id}: {e}")
+                print(f"Error loading games {loaded_games[0]}..{loaded_games[-1]}: {e}")
                 connection.rollback()
-                continue
+
+        elapsed = time.perf_counter() - started
+        if processed_games:
+            print(f"Loaded {processed_games} games ({processed_rows} rows) in {elapsed:.1f}s - "
+                  f"{processed_games / elapsed:.2f} games/s, {processed_rows / elapsed:.1f} rows/s")
 
     except (Exception, Error) as error:
         print(f"Database error: {error}")
@@ -149,4 +246,11 @@ def create_player_game_stats_table():
             connection.close()
 
 if __name__ == "__main__":
-    create_player_game_stats_table()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load player box scores into player_game_stats")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="number of games staged and upserted per transaction")
+    parser.add_argument("--full", action="store_true",
+                        help="reprocess every game instead of only missing or changed ones")
+    args = parser.parse_args()
+    create_player_game_stats_table(batch_size=args.batch_size, full=args.full)
+    print_api_stats()
\ No newline at end of file
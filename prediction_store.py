@@ -0,0 +1,135 @@
+from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, Boolean
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+from datetime import datetime, timedelta
+import os
+
+Base = declarative_base()
+
+# Database Model
+class PredictedGame(Base):
+    __tablename__ = 'predicted_games'
+
+    id = Column(Integer, primary_key=True)
+    game_id = Column(String, unique=True)
+    game_date = Column(DateTime, index=True)
+    home_team = Column(String)
+    away_team = Column(String)
+    predicted_winner = Column(String)
+    win_probability = Column(Float)
+    predicted_total = Column(Float)
+    actual_winner = Column(String, nullable=True)
+    actual_total = Column(Float, nullable=True)
+    prediction_correct = Column(Boolean, nullable=True)
+    total_difference = Column(Float, nullable=True)
+
+# Keep predictions.db next to the code instead of relative to the CWD
+DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'predictions.db')
+engine = create_engine(os.getenv("PREDICTIONS_DB_URL", f"sqlite:///{DB_PATH}"))
+Session = sessionmaker(bind=engine)
+
+def init_store():
+    """Create the predictions table if it does not exist"""
+    Base.metadata.create_all(engine)
+
+def save_predictions(games, predictions):
+    """Upsert predictions by game_id, leaving already reconciled games untouched"""
+    session = Session()
+    try:
+        game_ids = [str(game['game_id']) for game in games]
+        existing = {
+            row.game_id: row
+            for row in session.query(PredictedGame).filter(PredictedGame.game_id.in_(game_ids))
+        }
+
+        for game_id, game, pred in zip(game_ids, games, predictions):
+            row = existing.get(game_id)
+            if row is None:
+                row = PredictedGame(game_id=game_id)
+                session.add(row)
+            elif row.actual_winner is not None:
+                continue
+
+            row.game_date = game['date']
+            row.home_team = game['home_team']
+            row.away_team = game['away_team']
+            row.predicted_winner = pred['winner']
+            row.win_probability = pred['win_probability']
+            row.predicted_total = pred['total_points']
+
+        session.commit()
+    except Exception as e:
+        print(f"Error saving predictions: {str(e)}")
+        session.rollback()
+    finally:
+        session.close()
+
+def record_results(results):
+    """Reconcile final scores (game_id, home_score, away_score) into stored predictions"""
+    session = Session()
+    reconciled = 0
+    try:
+        results = {str(result['game_id']): result for result in results}
+        rows = session.query(PredictedGame).filter(PredictedGame.game_id.in_(list(results)))
+
+        for row in rows:
+            result = results[row.game_id]
+            actual_total = result['home_score'] + result['away_score']
+            row.actual_winner = row.home_team if result['home_score'] > result['away_score'] else row.away_team
+            row.actual_total = actual_total
+            row.prediction_correct = row.predicted_winner == row.actual_winner
+            row.total_difference = abs(round(row.predicted_total - actual_total, 1))
+            reconciled += 1
+
+        session.commit()
+    except Exception as e:
+        print(f"Error recording results: {str(e)}")
+        session.rollback()
+    finally:
+        session.close()
+    return reconciled
+
+def get_history(days=7):
+    """Get reconciled predictions from the past days along with summary stats"""
+    since = datetime.now() - timedelta(days=days + 1)
+    session = Session()
+    try:
+        rows = (
+            session.query(PredictedGame)
+            .filter(PredictedGame.game_date >= since, PredictedGame.actual_winner.isnot(None))
+            .order_by(PredictedGame.game_date)
+            .all()
+        )
+    finally:
+        session.close()
+
+    results = [
+        {
+            'date': row.game_date,
+            'home_team': row.home_team,
+            'away_team': row.away_team,
+            'predicted_winner': row.predicted_winner,
+            'actual_winner': row.actual_winner,
+            'prediction_correct': row.prediction_correct,
+            'predicted_total': round(row.predicted_total, 1),
+            'actual_total': int(row.actual_total),
+            'total_difference': row.total_difference,
+            'win_probability': f"{row.win_probability:.1f}%"
+        }
+        for row in rows
+    ]
+
+    # Calculate summary stats
+    total_games = len(results)
+    correct_winners = sum(1 for result in results if result['prediction_correct'])
+    total_points_diff = sum(result['total_difference'] for result in results)
+
+    summary_stats = {
+        'total_games': total_games,
+        'correct_predictions': correct_winners,
+        'incorrect_predictions': total_games - correct_winners,
+        'accuracy_percentage': (correct_winners / total_games * 100) if total_games > 0 else 0,
+        'avg_points_diff': (total_points_diff / total_games) if total_games > 0 else 0
+    }
+
+    return results, summary_stats
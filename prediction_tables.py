@@ -2,6 +2,23 @@ import psycopg2
 from dotenv import load_dotenv
 import os
 
+GAME_FEATURE_COLUMNS = [
+    ('home_team_score', 'INTEGER'),
+    ('away_team_score', 'INTEGER'),
+    ('home_off_rtg', 'FLOAT'),
+    ('home_pace', 'FLOAT'),
+    ('home_ts_pct', 'FLOAT'),
+    ('away_off_rtg', 'FLOAT'),
+    ('away_pace', 'FLOAT'),
+    ('away_ts_pct', 'FLOAT'),
+    ('league_avg_pace', 'FLOAT'),
+    ('league_avg_points', 'FLOAT'),
+    ('league_avg_ts', 'FLOAT'),
+    ('h2h_games', 'INTEGER'),
+    ('h2h_home_wins', 'INTEGER'),
+    ('h2h_home_win_pct', 'FLOAT')
+]
+
 def create_prediction_tables():
     connection = None
     try:
@@ -19,20 +36,25 @@ def create_prediction_tables():
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS game_predictions (
             id SERIAL PRIMARY KEY,
-            game_id VARCHAR(20) REFERENCES games(game_id),
+            game_id VARCHAR(20),
             prediction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             predicted_winner_id INTEGER REFERENCES teams(team_id),
             win_probability FLOAT,
             predicted_home_score INTEGER,
             predicted_away_score INTEGER,
-            predicted_total_points INTEGER,
+            predicted_total_points FLOAT,
             actual_winner_id INTEGER REFERENCES teams(team_id),
             prediction_accuracy BOOLEAN,
             UNIQUE(game_id)
         );
         ''')
+        # Upcoming game ids are not in games yet, so predictions cannot reference it;
+        # drops the key tables created before game_predictions held upcoming games
+        cursor.execute("ALTER TABLE game_predictions DROP CONSTRAINT IF EXISTS game_predictions_game_id_fkey;")
+        # Totals were stored as whole points before; the views show one decimal
+        cursor.execute("ALTER TABLE game_predictions ALTER COLUMN predicted_total_points TYPE FLOAT;")
 
-        # Game Features Table
+        # Game Features Table (materialized training features, see step_2_features_engineering.py)
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS game_features (
             id SERIAL PRIMARY KEY,
@@ -52,6 +74,11 @@ def create_prediction_tables():
         );
         ''')
 
+        # Columns added when game_features became the materialized step_2 output
+        for column, column_type in GAME_FEATURE_COLUMNS:
+            cursor.execute(f"ALTER TABLE game_features ADD COLUMN IF NOT EXISTS {column} {column_type};")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_game_features_game_date ON game_features (game_date);")
+
         connection.commit()
         print("Prediction tables created successfully")
 
@@ -0,0 +1,39 @@
+import numpy as np
+from serving_features import get_serving_features
+from model_bundle import get_model_bundle
+
+def prepare_slate_features(games, serving=None):
+    """Prepare the feature matrix for a list of games, one row per game"""
+    if serving is None:
+        serving = get_serving_features()
+
+    home_team_ids = [game['home_team_id'] for game in games]
+    away_team_ids = [game['away_team_id'] for game in games]
+    return serving.build(home_team_ids, away_team_ids, get_model_bundle().feature_columns)
+
+def predict_slate(games, serving=None):
+    """Make predictions for a whole slate of games in one pass"""
+    if not games:
+        return []
+
+    # Models are loaded lazily on the first prediction
+    bundle = get_model_bundle()
+    features = prepare_slate_features(games, serving)
+    features_scaled = bundle.scale(features)
+
+    win_probs = bundle.predict_home_win_probability(features_scaled)
+    total_points = bundle.predict_total(features_scaled)
+
+    home_wins = win_probs > 0.5
+    # Convert to percentage and cap at 99.9%
+    win_percentages = np.minimum(np.where(home_wins, win_probs, 1 - win_probs) * 100, 99.9)
+
+    return [
+        {
+            'winner': game['home_team'] if home_win else game['away_team'],
+            'winner_id': int(game['home_team_id'] if home_win else game['away_team_id']),
+            'win_probability': float(win_percentage),
+            'total_points': float(total)
+        }
+        for game, home_win, win_percentage, total in zip(games, home_wins, win_percentages, total_points)
+    ]
@@ -0,0 +1,265 @@
+import psycopg2
+from psycopg2 import Error, sql
+import os
+from dotenv import load_dotenv
+import argparse
+import json
+import time
+
+# Indexes for the filters and joins the loaders, step_2 and the app run.
+# Indexes created on a partitioned parent are created on every partition.
+INDEXES = [
+    ("idx_games_game_date", "games", "(game_date)"),
+    ("idx_games_home_team_date", "games", "(home_team_id, game_date)"),
+    ("idx_games_away_team_date", "games", "(away_team_id, game_date)"),
+    ("idx_games_matchup", "games", "(home_team_id, away_team_id)"),
+    ("idx_games_season", "games", "(season)"),
+    ("idx_player_game_stats_game_team", "player_game_stats", "(game_id, team_id)"),
+    ("idx_player_game_stats_player", "player_game_stats", "(player_id)"),
+    ("idx_team_metrics_date", "team_metrics", "(date)"),
+    ("idx_upcoming_games_game_date", "upcoming_games", "(game_date)")
+]
+
+# NBA game IDs are '00' + game type digit + two-digit season start year + sequence,
+# e.g. 0022400001 is the first regular season game of 2024-25. Each table is
+# range-partitioned by game type, then by season, so game_id stays the unique key.
+GAME_TYPES = {
+    'preseason': '001',
+    'regular': '002',
+    'allstar': '003',
+    'playoffs': '004',
+    'playin': '005',
+    'cup': '006'
+}
+
+# Primary keys of the partitioned tables; both must contain the partition key
+PARTITIONED_TABLES = {
+    'games': '(game_id)',
+    'player_game_stats': '(id, game_id)'
+}
+
+# Per-table unique constraints recreated on the partitioned table
+UNIQUE_CONSTRAINTS = {
+    'player_game_stats': [('player_game_stats_game_id_player_id_key', '(game_id, player_id)')]
+}
+
+def get_connection():
+    load_dotenv()
+    return psycopg2.connect(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        database="nba_stats"
+    )
+
+def season_year(season):
+    """Two-digit start year of a season given as '2024-25' or '2024'"""
+    return int(str(season)[:4]) % 100
+
+def next_prefix(prefix):
+    """Smallest game_id prefix after every ID starting with prefix"""
+    return f"{prefix[:-1]}{int(prefix[-1]) + 1}"
+
+def season_bounds(prefix, season):
+    """game_id range of one season of one game type"""
+    year = season_year(season)
+    upper = f"{prefix}{year + 1:02d}" if year < 99 else next_prefix(prefix)
+    return f"{prefix}{year:02d}", upper
+
+def table_exists(cursor, table):
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", (table,))
+    return cursor.fetchone()[0]
+
+def is_partitioned(cursor, table):
+    cursor.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return bool(row and row[0])
+
+def create_indexes(cursor):
+    """Create the supporting indexes on every table that exists"""
+    for name, table, columns in INDEXES:
+        if table_exists(cursor, table):
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} {columns};")
+    print(f"Indexes checked on {len({table for _, table, _ in INDEXES})} tables")
+
+def ensure_season_partitions(cursor, seasons):
+    """Create the per-season partitions of the partitioned tables, if they are partitioned.
+
+    Must run before a new season is loaded: rows already sitting in a default
+    partition block creating the partition they belong to.
+    """
+    for table in PARTITIONED_TABLES:
+        if not is_partitioned(cursor, table):
+            continue
+        for game_type, prefix in GAME_TYPES.items():
+            for season in seasons:
+                cursor.execute(sql.SQL(
+                    "CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s);"
+                ).format(
+                    sql.Identifier(f"{table}_{game_type}_{season_year(season):02d}"),
+                    sql.Identifier(f"{table}_{game_type}")
+                ), season_bounds(prefix, season))
+
+def create_partitioned_table(cursor, table, seasons):
+    """Create the partitioned table with one partition per game type and season"""
+    cursor.execute(sql.SQL(
+        "CREATE TABLE {} (LIKE {} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE (game_id);"
+    ).format(sql.Identifier(table), sql.Identifier(f"{table}_unpartitioned")))
+    cursor.execute(f"ALTER TABLE {table} ADD PRIMARY KEY {PARTITIONED_TABLES[table]};")
+    for name, columns in UNIQUE_CONSTRAINTS.get(table, []):
+        cursor.execute(f"ALTER TABLE {table} ADD CONSTRAINT {name} UNIQUE {columns};")
+
+    for game_type, prefix in GAME_TYPES.items():
+        cursor.execute(sql.SQL(
+            "CREATE TABLE {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s) PARTITION BY RANGE (game_id);"
+        ).format(
+            sql.Identifier(f"{table}_{game_type}"), sql.Identifier(table)
+        ), (prefix, next_prefix(prefix)))
+        cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT;").format(
+            sql.Identifier(f"{table}_{game_type}_default"), sql.Identifier(f"{table}_{game_type}")
+        ))
+    # Anything that is not a known game type
+    cursor.execute(sql.SQL("CREATE TABLE {} PARTITION OF {} DEFAULT;").format(
+        sql.Identifier(f"{table}_default"), sql.Identifier(table)
+    ))
+    ensure_season_partitions(cursor, seasons)
+
+def partition_table(cursor, table):
+    """Convert a table into a game_id range-partitioned table, keeping its data and foreign keys"""
+    if not table_exists(cursor, table):
+        print(f"{table} does not exist, skipping")
+        return
+    if is_partitioned(cursor, table):
+        print(f"{table} is already partitioned")
+        return
+
+    started = time.perf_counter()
+    cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE;")
+
+    # Foreign keys from and to the table are dropped and recreated on the new table.
+    # Keys referencing an already partitioned table have one clone per partition
+    # (conparentid set); those go away with their parent and cannot be dropped alone.
+    cursor.execute('''
+    SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE contype = 'f' AND conparentid = 0
+      AND (conrelid = %(table)s::regclass OR confrelid = %(table)s::regclass)
+    ''', {'table': table})
+    foreign_keys = cursor.fetchall()
+    for owner, name, _ in foreign_keys:
+        cursor.execute(f"ALTER TABLE {owner} DROP CONSTRAINT {name};")
+
+    # Serial columns keep their sequence instead of dropping it with the old table
+    cursor.execute('''
+    SELECT a.attname, pg_get_serial_sequence(%(table)s, a.attname)
+    FROM pg_attribute a
+    WHERE a.attrelid = %(table)s::regclass AND a.attnum > 0 AND NOT a.attisdropped
+      AND pg_get_serial_sequence(%(table)s, a.attname) IS NOT NULL
+    ''', {'table': table})
+    sequences = cursor.fetchall()
+    for _, sequence in sequences:
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY NONE;")
+
+    # Free the primary key and unique index names for the new table
+    cursor.execute('''
+    SELECT conname FROM pg_constraint
+    WHERE contype IN ('p', 'u') AND conrelid = %s::regclass
+    ''', (table,))
+    for (name,) in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {table} RENAME CONSTRAINT {name} TO {name}_old;")
+    cursor.execute(f"ALTER TABLE {table} RENAME TO {table}_unpartitioned;")
+
+    cursor.execute(f"SELECT DISTINCT substring(game_id, 4, 2) FROM {table}_unpartitioned WHERE game_id IS NOT NULL;")
+    seasons = sorted({f"20{row[0]}" for row in cursor.fetchall() if row[0] and row[0].isdigit()})
+    create_partitioned_table(cursor, table, seasons)
+
+    cursor.execute(f"INSERT INTO {table} SELECT * FROM {table}_unpartitioned;")
+    moved = cursor.rowcount
+    cursor.execute(f"DROP TABLE {table}_unpartitioned;")
+
+    for column, sequence in sequences:
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {table}.{column};")
+    # Owners were read before the rename, so outgoing keys land on the new table
+    for owner, name, definition in foreign_keys:
+        cursor.execute(f"ALTER TABLE {owner} ADD CONSTRAINT {name} {definition};")
+
+    print(f"Partitioned {table} ({moved} rows, {len(seasons)} seasons) in {time.perf_counter() - started:.1f}s")
+
+def benchmark_features_query(cursor):
+    """EXPLAIN ANALYZE the step_2 features query and return its timings"""
+    # Imported here so the loaders that only need ensure_season_partitions stay light
+    from step_2_features_engineering import FEATURES_QUERY
+
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {FEATURES_QUERY}")
+    plan = cursor.fetchone()[0]
+    plan = plan[0] if isinstance(plan, list) else json.loads(plan)[0]
+    return {
+        'planning_ms': plan['Planning Time'],
+        'execution_ms': plan['Execution Time'],
+        'rows': plan['Plan']['Actual Rows'],
+        'shared_blocks_read': plan['Plan'].get('Shared Read Blocks', 0),
+        'shared_blocks_hit': plan['Plan'].get('Shared Hit Blocks', 0)
+    }
+
+def print_benchmark(label, result):
+    print(f"{label}: {result['execution_ms']:.1f} ms execution, {result['planning_ms']:.1f} ms planning, "
+          f"{result['rows']} rows, {result['shared_blocks_hit']} blocks hit / "
+          f"{result['shared_blocks_read']} read")
+
+def migrate(partition=True, benchmark=True):
+    """Add the supporting indexes, partition games and player_game_stats, and benchmark step_2"""
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+
+        before = None
+        if benchmark:
+            before = benchmark_features_query(cursor)
+            print_benchmark("Before", before)
+            connection.rollback()
+
+        create_indexes(cursor)
+        connection.commit()
+
+        if partition:
+            # Each table is converted in its own transaction; games first, since
+            # player_game_stats references it
+            for table in PARTITIONED_TABLES:
+                partition_table(cursor, table)
+                connection.commit()
+            # Indexes are recreated on the new partitioned parents
+            create_indexes(cursor)
+            connection.commit()
+
+        cursor.execute("ANALYZE;")
+        connection.commit()
+
+        if benchmark:
+            after = benchmark_features_query(cursor)
+            print_benchmark("After", after)
+            connection.rollback()
+            print(f"Execution time {before['execution_ms']:.1f} ms -> {after['execution_ms']:.1f} ms "
+                  f"({before['execution_ms'] / max(after['execution_ms'], 1e-3):.2f}x)")
+
+    except (Exception, Error) as error:
+        print(f"Error: {error}")
+        if connection:
+            connection.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add indexes, partition games and player_game_stats by season, "
+                                                 "and benchmark the step_2 features query")
+    parser.add_argument("--no-partition", action="store_true",
+                        help="only create the indexes")
+    parser.add_argument("--no-benchmark", action="store_true",
+                        help="skip the EXPLAIN ANALYZE runs before and after")
+    args = parser.parse_args()
+    migrate(partition=not args.no_partition, benchmark=not args.no_benchmark)
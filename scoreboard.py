@@ -0,0 +1,39 @@
+from nba_api.stats.endpoints import scoreboardv2
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import pandas as pd
+from api_config import call_endpoint, MAX_WORKERS
+
+def fetch_scoreboard(game_date):
+    """Fetch game_header and line_score frames for a single date"""
+    scoreboard = call_endpoint(scoreboardv2.ScoreboardV2, game_date=game_date.strftime('%Y-%m-%d'))
+    return scoreboard.game_header.get_data_frame(), scoreboard.line_score.get_data_frame()
+
+def fetch_scoreboards(dates, max_workers=MAX_WORKERS):
+    """Fetch scoreboards for several dates concurrently and combine them into
+    one game_header and one line_score frame (dates that fail are skipped)"""
+    dates = list(dates)
+    results = {}
+
+    if dates:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(dates))) as executor:
+            futures = {executor.submit(fetch_scoreboard, date): date for date in dates}
+            for future in as_completed(futures):
+                date = futures[future]
+                try:
+                    results[date] = future.result()
+                except Exception as e:
+                    print(f"Error fetching games for {date.strftime('%Y-%m-%d')}: {str(e)}")
+
+    # Keep the combined frames in date order regardless of completion order
+    fetched = [results[date] for date in dates if date in results]
+    if not fetched:
+        return pd.DataFrame(), pd.DataFrame()
+
+    game_header = pd.concat([header for header, _ in fetched], ignore_index=True)
+    line_score = pd.concat([scores for _, scores in fetched], ignore_index=True)
+    return game_header, line_score
+
+def fetch_scoreboard_range(start_date, end_date, max_workers=MAX_WORKERS):
+    """Fetch scoreboards for every date between start_date and end_date (inclusive)"""
+    dates = pd.date_range(start=start_date, end=end_date).to_pydatetime()
+    return fetch_scoreboards(dates, max_workers=max_workers)
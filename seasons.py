@@ -0,0 +1,12 @@
+def season_start_year(season):
+    """Start year of a season given as '2024-25' (LeagueGameFinder) or '2024' (ScoreboardV2)"""
+    return int(str(season)[:4])
+
+def season_label(season):
+    """Normalize a season to the 'YYYY-YY' label stored in games.season"""
+    start = season_start_year(season)
+    return f"{start}-{(start + 1) % 100:02d}"
+
+def season_code(season):
+    """Two-digit season code embedded in game IDs (0022400001 -> '24' for 2024-25)"""
+    return f"{season_start_year(season) % 100:02d}"
@@ -0,0 +1,168 @@
+import psycopg2
+from psycopg2 import Error
+import numpy as np
+import os
+from dotenv import load_dotenv
+import argparse
+import time
+from snapshot_cache import SnapshotCache
+from team_index import get_team_slots
+from team_game_stats import TRAILING_RATES_QUERY
+
+# Seconds before the app reloads the serving snapshot from the database
+SERVING_FEATURES_TTL = int(os.getenv("SERVING_FEATURES_TTL", "3600"))
+
+# Each team's trailing rates as of its next game, the same definition step_2 trains on
+REFRESH_QUERY = f'''
+INSERT INTO team_serving_features
+(team_id, games, as_of_date, off_rtg, pace, ts_pct, updated_at)
+SELECT team_id, games, as_of_date, off_rtg, pace, ts_pct, CURRENT_TIMESTAMP
+FROM ({TRAILING_RATES_QUERY}) trailing_rates
+WHERE game_id IS NULL
+ON CONFLICT (team_id) DO UPDATE
+SET games = EXCLUDED.games,
+    as_of_date = EXCLUDED.as_of_date,
+    off_rtg = EXCLUDED.off_rtg,
+    pace = EXCLUDED.pace,
+    ts_pct = EXCLUDED.ts_pct,
+    updated_at = EXCLUDED.updated_at;
+'''
+
+# Maintained by matchup_stats.py and update_completed_games
+H2H_QUERY = '''
+SELECT home_team_id, away_team_id, games_played, home_wins
+FROM matchup_stats;
+'''
+
+def get_connection():
+    load_dotenv()
+    return psycopg2.connect(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST", "localhost"),
+        port=os.getenv("DB_PORT", "5432"),
+        database="nba_stats"
+    )
+
+def create_serving_features_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS team_serving_features (
+        team_id INTEGER PRIMARY KEY REFERENCES teams(team_id),
+        games INTEGER,
+        as_of_date DATE,
+        off_rtg FLOAT,
+        pace FLOAT,
+        ts_pct FLOAT,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    ''')
+
+def refresh_serving_features(cursor):
+    """Recompute every team's serving aggregates from team_game_stats"""
+    create_serving_features_table(cursor)
+    cursor.execute(REFRESH_QUERY)
+    return cursor.rowcount
+
+class ServingFeatures:
+    """Per-team aggregates and head-to-head counts as dense arrays indexed by team slot"""
+
+    def __init__(self, team_rows=(), h2h_rows=()):
+        slots = get_team_slots()
+        self.team_ids = np.array(sorted(slots), dtype=np.int64)
+        # One extra slot holds the fallbacks for team IDs outside the index
+        n_slots = len(slots) + 1
+
+        # NaN for teams without history, like the NULL trailing rates of a team's
+        # first game in training
+        self.off_rtg = np.full(n_slots, np.nan, dtype=np.float32)
+        self.pace = np.full(n_slots, np.nan, dtype=np.float32)
+        self.ts_pct = np.full(n_slots, np.nan, dtype=np.float32)
+        for team_id, off_rtg, pace, ts_pct in team_rows:
+            slot = slots.get(team_id)
+            if slot is not None and None not in (off_rtg, pace, ts_pct):
+                self.off_rtg[slot], self.pace[slot], self.ts_pct[slot] = off_rtg, pace, ts_pct
+
+        self.h2h_games = np.zeros((n_slots, n_slots), dtype=np.float32)
+        self.h2h_home_wins = np.zeros((n_slots, n_slots), dtype=np.float32)
+        for home_team_id, away_team_id, games_played, home_wins in h2h_rows:
+            home_slot, away_slot = slots.get(home_team_id), slots.get(away_team_id)
+            if home_slot is not None and away_slot is not None:
+                self.h2h_games[home_slot, away_slot] = games_played
+                self.h2h_home_wins[home_slot, away_slot] = home_wins
+
+    def slots(self, team_ids):
+        """Vectorized team ID -> slot lookup; unknown IDs map to the fallback slot"""
+        team_ids = np.asarray(team_ids, dtype=np.int64)
+        slots = np.minimum(np.searchsorted(self.team_ids, team_ids), len(self.team_ids) - 1)
+        return np.where(self.team_ids[slots] == team_ids, slots, len(self.team_ids))
+
+    def build(self, home_team_ids, away_team_ids, feature_columns):
+        """Feature matrix for (home, away) pairs, columns in feature_columns order"""
+        home = self.slots(home_team_ids)
+        away = self.slots(away_team_ids)
+
+        h2h_games = self.h2h_games[home, away]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # NaN without history, like the NULL the training query produces
+            h2h_home_win_pct = np.where(h2h_games > 0, self.h2h_home_wins[home, away] / h2h_games, np.nan)
+
+        features = {
+            'off_rtg_diff': self.off_rtg[home] - self.off_rtg[away],
+            'ts_pct_diff': self.ts_pct[home] - self.ts_pct[away],
+            'pace_diff': self.pace[home] - self.pace[away],
+            'away_off_rtg': self.off_rtg[away],
+            'home_off_rtg': self.off_rtg[home],
+            'h2h_games': h2h_games,
+            'h2h_home_wins': self.h2h_home_wins[home, away],
+            'h2h_home_win_pct': h2h_home_win_pct
+        }
+        return np.column_stack([features[column] for column in feature_columns]).astype(np.float32)
+
+def load_serving_features():
+    """Read the stored team aggregates and head-to-head counts into a ServingFeatures snapshot"""
+    connection = get_connection()
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT team_id, off_rtg, pace, ts_pct FROM team_serving_features;")
+            team_rows = cursor.fetchall()
+            cursor.execute(H2H_QUERY)
+            h2h_rows = cursor.fetchall()
+    finally:
+        connection.close()
+    return ServingFeatures(team_rows, h2h_rows)
+
+serving_features_cache = SnapshotCache(load_serving_features, SERVING_FEATURES_TTL)
+
+def get_serving_features():
+    """Get the cached serving snapshot; raises if it has never been loaded.
+
+    Predictions from league-average fallbacks alone would be stored and shown
+    as real ones, so a database outage is surfaced instead.
+    """
+    serving = serving_features_cache.get()
+    if serving is None:
+        raise RuntimeError("Serving features could not be loaded from the database")
+    return serving
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Refresh the per-team serving feature aggregates")
+    parser.parse_args()
+
+    connection = None
+    cursor = None
+    try:
+        connection = get_connection()
+        cursor = connection.cursor()
+        started = time.perf_counter()
+        rows = refresh_serving_features(cursor)
+        connection.commit()
+        print(f"Refreshed serving features for {rows} teams in {time.perf_counter() - started:.2f}s")
+    except (Exception, Error) as error:
+        print(f"Error: {error}")
+        if connection:
+            connection.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
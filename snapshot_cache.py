@@ -0,0 +1,49 @@
+import threading
+import time
+
+class SnapshotCache:
+    """Hold the latest result of a loader and refresh it in the background once stale"""
+
+    def __init__(self, loader, ttl):
+        self.loader = loader
+        self.ttl = ttl
+        self._snapshot = None
+        self._loaded_at = 0.0
+        self._refreshing = False
+        self._lock = threading.Lock()
+
+    def get(self):
+        """Return the current snapshot, loading it synchronously only on first use.
+
+        Returns None while no load has succeeded yet.
+        """
+        with self._lock:
+            if self._snapshot is None:
+                self._load()
+                return self._snapshot
+
+            if time.monotonic() - self._loaded_at > self.ttl and not self._refreshing:
+                self._refreshing = True
+                threading.Thread(target=self._background_refresh, daemon=True).start()
+
+            return self._snapshot
+
+    def _load(self):
+        try:
+            self._snapshot = self.loader()
+            self._loaded_at = time.monotonic()
+        except Exception as e:
+            print(f"Error loading snapshot: {str(e)}")
+
+    def _background_refresh(self):
+        try:
+            snapshot = self.loader()
+            with self._lock:
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+        except Exception as e:
+            # Keep serving the previous snapshot until the next attempt
+            print(f"Error refreshing snapshot: {str(e)}")
+        finally:
+            with self._lock:
+                self._refreshing = False
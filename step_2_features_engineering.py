@@ -1,7 +1,55 @@
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
+import numpy as np
+import logging
+import argparse
+import tracemalloc
+import json
+import time
 import os
+from team_index import get_valid_team_ids
+from team_game_stats import TRAILING_RATES_QUERY
+
+try:
+    import pyarrow.feather as feather
+except ImportError:
+    feather = None
+
+# Local columnar copy of the feature frame, tagged with the game_features watermark
+FEATURE_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'features')
+FEATURE_CACHE_PATH = os.path.join(FEATURE_CACHE_DIR, 'training_features.feather')
+FEATURE_CACHE_META_PATH = os.path.join(FEATURE_CACHE_DIR, 'training_features.json')
+
+# Rows fetched per round trip from the server-side cursor
+CHUNK_SIZE = 5000
+
+# Compact dtypes for the feature frame; everything else stays as read
+FEATURE_DTYPES = {
+    'home_team_score': 'int16',
+    'away_team_score': 'int16',
+    'home_l5_wins': 'int8',
+    'home_l10_wins': 'int8',
+    'away_l5_wins': 'int8',
+    'away_l10_wins': 'int8',
+    'home_pts_avg': 'float32',
+    'home_win_pct': 'float32',
+    'away_pts_avg': 'float32',
+    'away_win_pct': 'float32',
+    'home_off_rtg': 'float32',
+    'home_pace': 'float32',
+    'home_ts_pct': 'float32',
+    'away_off_rtg': 'float32',
+    'away_pace': 'float32',
+    'away_ts_pct': 'float32',
+    'league_avg_pace': 'float32',
+    'league_avg_points': 'float32',
+    'league_avg_ts': 'float32',
+    # Head-to-head columns can be NULL, so they stay floating point
+    'h2h_games': 'float32',
+    'h2h_home_wins': 'float32',
+    'h2h_home_win_pct': 'float32'
+}
 
 def get_db_engine():
     """Create SQLAlchemy database engine"""
@@ -15,10 +63,11 @@ def get_db_engine():
     }
     return create_engine(f'postgresql://{db_params["user"]}:{db_params["password"]}@{db_params["host"]}:{db_params["port"]}/{db_params["database"]}')
 
-def prepare_training_features():
-    engine = get_db_engine()
-    
-    features_query = '''
+# Full feature computation for completed games; refresh_game_features materializes
+# its output into game_features so training and analysis only read a prebuilt table.
+# Every team and matchup feature is point-in-time: it only uses games played before
+# the one it describes, the same values serving computes for an upcoming game.
+FEATURES_QUERY = f'''
     WITH league_metrics AS (
         SELECT 
             AVG(points) as avg_points,
@@ -26,78 +75,274 @@ def prepare_training_features():
             AVG(CAST(points AS float) / (2 * NULLIF(field_goals_attempted + 0.44 * free_throws_attempted, 0))) as avg_ts
         FROM team_game_stats
     ),
-    advanced_stats AS (
-        SELECT 
-            tgs.*,
-            (field_goals_attempted + 0.44 * free_throws_attempted - total_rebounds * 0.3 + turnovers) as possessions,
-            100.0 * points / NULLIF(field_goals_attempted + 0.44 * free_throws_attempted - total_rebounds * 0.3 + turnovers, 0) as off_rtg,
-            points::float / (2 * NULLIF(field_goals_attempted + 0.44 * free_throws_attempted, 0)) as true_shooting,
-            lm.avg_points, lm.avg_pace, lm.avg_ts
-        FROM team_game_stats tgs
-        CROSS JOIN league_metrics lm
+    trailing_rates AS (
+        {TRAILING_RATES_QUERY}
     ),
-    matchup_stats AS (
-        SELECT 
-            home_team_id,
-            away_team_id,
-            COUNT(*) as games_played,
-            SUM(CASE WHEN home_team_score > away_team_score THEN 1 ELSE 0 END) as home_team_wins
-        FROM games 
-        GROUP BY home_team_id, away_team_id
+    -- Head-to-head record of the pairing before each game; matchup_stats.py holds
+    -- the same counts after the latest game for serving
+    prior_matchups AS (
+        SELECT
+            game_id,
+            COUNT(*) OVER prior AS games_played,
+            COALESCE(SUM(CASE WHEN home_team_score > away_team_score THEN 1 ELSE 0 END) OVER prior, 0) AS home_wins
+        FROM games
+        WHERE home_team_score IS NOT NULL
+        WINDOW prior AS (
+            PARTITION BY home_team_id, away_team_id ORDER BY game_date, game_id
+            ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+        )
     )
     SELECT 
         g.game_id, g.game_date,
         g.home_team_id, g.away_team_id,
         g.home_team_score, g.away_team_score,
         -- Team metrics
-        tm_home.last_5_wins as home_l5_wins,
-        tm_home.last_10_wins as home_l10_wins,
-        tm_home.points_scored_avg as home_pts_avg,
+        tm_home.last_5_wins AS home_last_5_wins,
+        tm_home.last_10_wins AS home_last_10_wins,
+        tm_home.points_scored_avg AS home_points_avg,
         tm_home.home_win_pct as home_win_pct,
-        tm_away.last_5_wins as away_l5_wins,
-        tm_away.last_10_wins as away_l10_wins,
-        tm_away.points_scored_avg as away_pts_avg,
+        tm_away.last_5_wins AS away_last_5_wins,
+        tm_away.last_10_wins AS away_last_10_wins,
+        tm_away.points_scored_avg AS away_points_avg,
         tm_away.away_win_pct as away_win_pct,
-        -- Advanced metrics
+        -- Advanced metrics, trailing averages before the game
         h.off_rtg as home_off_rtg,
-        h.possessions as home_pace,
-        h.true_shooting as home_ts_pct,
+        h.pace as home_pace,
+        h.ts_pct as home_ts_pct,
         a.off_rtg as away_off_rtg,
-        a.possessions as away_pace,
-        a.true_shooting as away_ts_pct,
+        a.pace as away_pace,
+        a.ts_pct as away_ts_pct,
         -- League averages
-        h.avg_pace as league_avg_pace,
-        h.avg_points as league_avg_points,
-        h.avg_ts as league_avg_ts,
+        lm.avg_pace as league_avg_pace,
+        lm.avg_points as league_avg_points,
+        lm.avg_ts as league_avg_ts,
         -- Matchup history
-        ms.games_played as h2h_games,
-        ms.home_team_wins as h2h_home_wins,
-        CAST(ms.home_team_wins AS FLOAT) / NULLIF(ms.games_played, 0) as h2h_home_win_pct
+        pm.games_played as h2h_games,
+        pm.home_wins as h2h_home_wins,
+        CAST(pm.home_wins AS FLOAT) / NULLIF(pm.games_played, 0) as h2h_home_win_pct
     FROM games g
-    JOIN advanced_stats h ON g.game_id = h.game_id AND g.home_team_id = h.team_id
-    JOIN advanced_stats a ON g.game_id = a.game_id AND g.away_team_id = a.team_id
-    JOIN team_metrics tm_home ON g.home_team_id = tm_home.team_id 
-    JOIN team_metrics tm_away ON g.away_team_id = tm_away.team_id
-    LEFT JOIN matchup_stats ms ON g.home_team_id = ms.home_team_id 
-        AND g.away_team_id = ms.away_team_id
+    -- One trailing row per team_game_stats row, so games without box scores drop out
+    JOIN trailing_rates h ON g.game_id = h.game_id AND g.home_team_id = h.team_id
+    JOIN trailing_rates a ON g.game_id = a.game_id AND g.away_team_id = a.team_id
+    -- Point-in-time team metrics as of the game date (see team_metrics_history.py)
+    JOIN team_metrics tm_home ON g.home_team_id = tm_home.team_id AND tm_home.date = g.game_date
+    JOIN team_metrics tm_away ON g.away_team_id = tm_away.team_id AND tm_away.date = g.game_date
+    JOIN prior_matchups pm ON pm.game_id = g.game_id
+    CROSS JOIN league_metrics lm
     WHERE g.home_team_score IS NOT NULL
-    ORDER BY g.game_date DESC;
-    '''
-    
-    df = pd.read_sql_query(features_query, engine)
-    
-    # Calculate target variables and differentials
-    df['home_win'] = (df['home_team_score'] > df['away_team_score']).astype(int)
+'''
+
+# Games missing from game_features that FEATURES_QUERY can produce: the same inner
+# joins, so games still waiting for team_game_stats or team_metrics are not counted
+PENDING_FEATURES_QUERY = '''
+SELECT COUNT(*)
+FROM games g
+JOIN team_game_stats h ON g.game_id = h.game_id AND g.home_team_id = h.team_id
+JOIN team_game_stats a ON g.game_id = a.game_id AND g.away_team_id = a.team_id
+JOIN team_metrics tm_home ON g.home_team_id = tm_home.team_id AND tm_home.date = g.game_date
+JOIN team_metrics tm_away ON g.away_team_id = tm_away.team_id AND tm_away.date = g.game_date
+WHERE g.home_team_score IS NOT NULL
+  AND NOT EXISTS (SELECT 1 FROM game_features gf WHERE gf.game_id = g.game_id)
+'''
+
+FEATURE_TABLE_COLUMNS = [
+    'game_id', 'game_date', 'home_team_id', 'away_team_id',
+    'home_team_score', 'away_team_score',
+    'home_last_5_wins', 'home_last_10_wins', 'home_points_avg', 'home_win_pct',
+    'away_last_5_wins', 'away_last_10_wins', 'away_points_avg', 'away_win_pct',
+    'home_off_rtg', 'home_pace', 'home_ts_pct',
+    'away_off_rtg', 'away_pace', 'away_ts_pct',
+    'league_avg_pace', 'league_avg_points', 'league_avg_ts',
+    'h2h_games', 'h2h_home_wins', 'h2h_home_win_pct'
+]
+
+# Read the materialized features back under the names the models and analysis use
+READ_FEATURES_QUERY = '''
+SELECT 
+    game_id, game_date,
+    home_team_id, away_team_id,
+    home_team_score, away_team_score,
+    home_last_5_wins AS home_l5_wins,
+    home_last_10_wins AS home_l10_wins,
+    home_points_avg AS home_pts_avg,
+    home_win_pct,
+    away_last_5_wins AS away_l5_wins,
+    away_last_10_wins AS away_l10_wins,
+    away_points_avg AS away_pts_avg,
+    away_win_pct,
+    home_off_rtg, home_pace, home_ts_pct,
+    away_off_rtg, away_pace, away_ts_pct,
+    league_avg_pace, league_avg_points, league_avg_ts,
+    h2h_games, h2h_home_wins, h2h_home_win_pct
+FROM game_features
+{where}
+ORDER BY game_date DESC;
+'''
+
+def refresh_game_features(engine, rebuild=False):
+    """Insert features for completed games missing from game_features (all games if rebuild)"""
+    started = time.perf_counter()
+    columns = ', '.join(FEATURE_TABLE_COLUMNS)
+    updates = ',\n        '.join(f"{column} = EXCLUDED.{column}" for column in FEATURE_TABLE_COLUMNS[1:])
+
+    with engine.begin() as connection:
+        if not rebuild:
+            pending = connection.execute(text(PENDING_FEATURES_QUERY)).scalar()
+            if not pending:
+                logging.info("game_features is up to date")
+                return 0
+
+        result = connection.execute(text(f'''
+        INSERT INTO game_features ({columns})
+        SELECT {columns}
+        FROM ({FEATURES_QUERY}) f
+        WHERE :rebuild OR NOT EXISTS (SELECT 1 FROM game_features gf WHERE gf.game_id = f.game_id)
+        ON CONFLICT (game_id) DO UPDATE
+        SET {updates};
+        '''), {'rebuild': rebuild})
+
+    if rebuild:
+        # Rebuilt rows can change without moving the watermark
+        clear_feature_cache()
+
+    logging.info(f"Refreshed {result.rowcount} game_features rows in {time.perf_counter() - started:.2f}s")
+    return result.rowcount
+
+def downcast_features(df):
+    """Convert a chunk of game_features rows to compact dtypes"""
+    # Fixed categories keep team id columns categorical when chunks are concatenated
+    team_ids = pd.CategoricalDtype(sorted(get_valid_team_ids()))
+    df = df.astype({column: dtype for column, dtype in FEATURE_DTYPES.items() if column in df.columns})
+    df['home_team_id'] = df['home_team_id'].astype(team_ids)
+    df['away_team_id'] = df['away_team_id'].astype(team_ids)
+    df['game_date'] = pd.to_datetime(df['game_date'])
+    return df
+
+def add_derived_features(df):
+    """Calculate target variables and differentials"""
+    df['home_win'] = (df['home_team_score'] > df['away_team_score']).astype(np.int8)
     df['total_points'] = df['home_team_score'] + df['away_team_score']
     df['pace_diff'] = df['home_pace'] - df['away_pace']
     df['off_rtg_diff'] = df['home_off_rtg'] - df['away_off_rtg']
     df['ts_pct_diff'] = df['home_ts_pct'] - df['away_ts_pct']
     df['home_pace_vs_avg'] = df['home_pace'] / df['league_avg_pace']
     df['away_pace_vs_avg'] = df['away_pace'] / df['league_avg_pace']
+    return df
+
+def iter_training_features(chunksize=CHUNK_SIZE, refresh=True, since=None, engine=None):
+    """Stream training features from game_features in compact chunks via a server-side cursor"""
+    engine = engine or get_db_engine()
+    if refresh:
+        refresh_game_features(engine)
+    
+    query = READ_FEATURES_QUERY.format(where="WHERE game_date >= :since" if since is not None else "")
+    params = {'since': since} if since is not None else {}
+    with engine.connect().execution_options(stream_results=True) as connection:
+        for chunk in pd.read_sql_query(text(query), connection, params=params, chunksize=chunksize):
+            yield add_derived_features(downcast_features(chunk))
+
+def get_features_watermark(engine):
+    """Latest game date and row count of game_features"""
+    with engine.connect() as connection:
+        max_game_date, row_count = connection.execute(
+            text("SELECT MAX(game_date), COUNT(*) FROM game_features")
+        ).one()
+    return {'max_game_date': max_game_date.isoformat() if max_game_date else None, 'row_count': row_count}
+
+def read_feature_cache():
+    """Return (frame, watermark) from the local cache, or (None, None) if there is none"""
+    if feather is None or not (os.path.exists(FEATURE_CACHE_PATH) and os.path.exists(FEATURE_CACHE_META_PATH)):
+        return None, None
+    with open(FEATURE_CACHE_META_PATH) as f:
+        watermark = json.load(f)
+    # Uncompressed Feather files are memory-mapped instead of copied into memory
+    df = feather.read_table(FEATURE_CACHE_PATH, memory_map=True).to_pandas()
+    return df, watermark
+
+def write_feature_cache(df, watermark):
+    """Store the frame and its watermark; the metadata is written last so a partial write is never served"""
+    if feather is None:
+        return
+    os.makedirs(FEATURE_CACHE_DIR, exist_ok=True)
+    if os.path.exists(FEATURE_CACHE_META_PATH):
+        os.remove(FEATURE_CACHE_META_PATH)
+    feather.write_feather(df, FEATURE_CACHE_PATH, compression='uncompressed')
+    with open(FEATURE_CACHE_META_PATH, 'w') as f:
+        json.dump(watermark, f)
+
+def clear_feature_cache():
+    """Remove the local feature cache"""
+    for path in (FEATURE_CACHE_META_PATH, FEATURE_CACHE_PATH):
+        if os.path.exists(path):
+            os.remove(path)
+
+def load_cached_features(engine, chunksize=CHUNK_SIZE):
+    """Serve features from the local cache, appending only rows newer than its watermark"""
+    watermark = get_features_watermark(engine)
+    cached_df, cached_watermark = read_feature_cache()
+    
+    if cached_df is not None and cached_watermark == watermark:
+        logging.info("Feature cache is current")
+        return cached_df
+    
+    if cached_df is not None and cached_watermark['max_game_date'] and \
+            cached_watermark['row_count'] < watermark['row_count']:
+        # Re-read from the cached max date so rows added for that same day are included
+        new_rows = pd.concat(list(iter_training_features(
+            chunksize=chunksize, refresh=False, since=cached_watermark['max_game_date'], engine=engine
+        )), ignore_index=True)
+        df = (
+            pd.concat([new_rows, cached_df], ignore_index=True)
+            .drop_duplicates('game_id', keep='first')
+            .sort_values('game_date', ascending=False, kind='stable')
+            .reset_index(drop=True)
+        )
+        if len(df) == watermark['row_count']:
+            logging.info(f"Appended {len(df) - len(cached_df)} new rows to the feature cache")
+            write_feature_cache(df, watermark)
+            return df
+    
+    chunks = list(iter_training_features(chunksize=chunksize, refresh=False, engine=engine))
+    df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    write_feature_cache(df, watermark)
+    return df
+
+def prepare_training_features(refresh=True, chunksize=CHUNK_SIZE, report_memory=True, use_cache=True):
+    """Load training features from the materialized game_features table as one compact frame"""
+    tracing = report_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    
+    started = time.perf_counter()
+    engine = get_db_engine()
+    if refresh:
+        refresh_game_features(engine)
+    
+    if use_cache and feather is not None:
+        df = load_cached_features(engine, chunksize=chunksize)
+    else:
+        if use_cache:
+            logging.warning("pyarrow is not installed (see requirements.txt), feature cache disabled")
+        chunks = list(iter_training_features(chunksize=chunksize, refresh=False, engine=engine))
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+    logging.info(f"Loaded {len(df)} game_features rows in {time.perf_counter() - started:.2f}s "
+                 f"({df.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB in memory)")
+    
+    if tracing:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        logging.info(f"Peak memory while loading features: {peak / 1024 ** 2:.1f} MB")
     
     return df
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = argparse.ArgumentParser(description="Materialize and load the training features")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute every game_features row instead of only missing games")
+    args = parser.parse_args()
+    if args.rebuild:
+        refresh_game_features(get_db_engine(), rebuild=True)
     df = prepare_training_features()
     print(f"\nGenerated features for {len(df)} games")
     print("\nFeature columns:")
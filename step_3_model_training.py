@@ -1,15 +1,25 @@
 import os
+import time
 import logging
+import argparse
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
+from joblib import Parallel, delayed
+from sklearn.model_selection import TimeSeriesSplit, ParameterGrid
 from sklearn.preprocessing import StandardScaler
-from xgboost import XGBRegressor
-from sklearn.metrics import accuracy_score, mean_squared_error, r2_score
+from sklearn.isotonic import IsotonicRegression
+from xgboost import XGBRegressor, XGBClassifier
+from sklearn.metrics import accuracy_score, mean_squared_error, r2_score, log_loss, brier_score_loss
 import joblib
+from concurrent.futures import ThreadPoolExecutor
 from step_2_features_engineering import prepare_training_features
+from model_bundle import export_inference_bundle, check_bundle_parity, BUNDLE_DIR
 
 # Constants
+N_JOBS = int(os.getenv("TRAIN_N_JOBS", str(os.cpu_count() or 1)))
+TEST_SIZE = 0.2        # Newest games held out for evaluation
+VALIDATION_SIZE = 0.1  # Games just before the test set, used for early stopping
+
 MODEL_PARAMS = {
     'n_estimators': 1000,
     'learning_rate': 0.01,
@@ -18,9 +28,29 @@ MODEL_PARAMS = {
     'colsample_bytree': 0.8,
     'objective': 'reg:squarederror',
     'eval_metric': 'rmse',
+    'tree_method': 'hist',
+    'n_jobs': N_JOBS,
     'random_state': 42
 }
 
+# The winner model is a binary classifier on the same tree settings
+WINNER_PARAMS = {
+    **MODEL_PARAMS,
+    'objective': 'binary:logistic',
+    'eval_metric': 'logloss'
+}
+
+# Search space for --tune; every combination is scored with time-series CV
+PARAM_GRID = {
+    'max_depth': [3, 4, 5],
+    'learning_rate': [0.01, 0.05, 0.1],
+    'subsample': [0.8, 1.0],
+    'min_child_weight': [1, 5]
+}
+CV_SPLITS = 5
+EARLY_STOPPING_ROUNDS = 50
+PARITY_TOLERANCE = {'win_probability': 1e-4, 'total_points': 1e-2}  # Slim bundle vs joblib artifact
+
 # Features ordered by importance
 PRIMARY_FEATURES = [
     'off_rtg_diff',      # Offensive rating differential
@@ -31,53 +61,225 @@ PRIMARY_FEATURES = [
     'home_off_rtg'       # Home team offensive rating
 ]
 
-def evaluate_model(model, X_test, y_test, is_winner=True):
+def predict_home_win_probability(winner_model, calibrator, X):
+    """Calibrated home win probabilities for a batch of scaled feature rows"""
+    probabilities = winner_model.predict_proba(X)[:, 1]
+    return calibrator.predict(probabilities) if calibrator is not None else probabilities
+
+def evaluate_model(model, X_test, y_test, is_winner=True, calibrator=None):
     """Evaluate model performance and log metrics"""
-    predictions = model.predict(X_test)
-    metrics = {
-        'r2': r2_score(y_test, predictions)
-    }
-    
     if is_winner:
-        metrics['accuracy'] = accuracy_score(y_test, predictions.round())
-        logging.info(f"Winner Model - Accuracy: {metrics['accuracy']:.3f}, R²: {metrics['r2']:.3f}")
+        predictions = predict_home_win_probability(model, calibrator, X_test)
+        metrics = {
+            'accuracy': accuracy_score(y_test, predictions >= 0.5),
+            'log_loss': log_loss(y_test, np.clip(predictions, 1e-6, 1 - 1e-6)),
+            'brier': brier_score_loss(y_test, predictions)
+        }
+        logging.info(f"Winner Model - Accuracy: {metrics['accuracy']:.3f}, "
+                     f"Log loss: {metrics['log_loss']:.3f}, Brier: {metrics['brier']:.3f}")
     else:
-        metrics['rmse'] = np.sqrt(mean_squared_error(y_test, predictions))
+        predictions = model.predict(X_test)
+        metrics = {
+            'r2': r2_score(y_test, predictions),
+            'rmse': np.sqrt(mean_squared_error(y_test, predictions))
+        }
         logging.info(f"Total Points Model - RMSE: {metrics['rmse']:.1f}, R²: {metrics['r2']:.3f}")
     
     return metrics, predictions
 
-def train_prediction_models():
+def time_ordered_bounds(n_rows, test_size=TEST_SIZE, validation_size=VALIDATION_SIZE):
+    """Row offsets where the validation and test ranges start in chronologically ordered data"""
+    test_start = int(n_rows * (1 - test_size))
+    validation_start = int(n_rows * (1 - test_size - validation_size))
+    return validation_start, test_start
+
+def fit_with_early_stopping(name, estimator_cls, params, X_train, y_train, X_val, y_val):
+    """Fit an XGBoost model that stops once the validation score stops improving"""
+    model = estimator_cls(**{**params, 'early_stopping_rounds': EARLY_STOPPING_ROUNDS})
+    started = time.perf_counter()
+    model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+    fit_seconds = time.perf_counter() - started
+    
+    stats = {
+        'trees_used': model.best_iteration + 1,
+        'trees_built': model.get_booster().num_boosted_rounds(),
+        'fit_seconds': fit_seconds
+    }
+    logging.info(f"{name} model - {stats['trees_used']} trees used "
+                 f"({stats['trees_built']} built), fit in {fit_seconds:.2f}s")
+    return model, stats
+
+def fit_final(estimator_cls, params, n_estimators, X, y):
+    """Refit on every row with the tree count early stopping picked"""
+    model = estimator_cls(**{**params, 'n_estimators': n_estimators})
+    model.fit(X, y, verbose=False)
+    return model
+
+def cross_fit_probabilities(params, n_estimators, X, y, n_splits=CV_SPLITS):
+    """Out-of-fold home win probabilities: each fold of a time-ordered split is
+    scored by a model with the final settings fitted only on the rows before it"""
+    probabilities, labels = [], []
+    for train_index, test_index in TimeSeriesSplit(n_splits=n_splits).split(X):
+        model = fit_final(XGBClassifier, params, n_estimators, X[train_index], y[train_index])
+        probabilities.append(model.predict_proba(X[test_index])[:, 1])
+        labels.append(y[test_index])
+    return np.concatenate(probabilities), np.concatenate(labels)
+
+def evaluate_params(estimator_cls, base_params, params, X, y, splits):
+    """Score one parameter set over time-ordered folds, early stopping on each validation fold"""
+    started = time.perf_counter()
+    scores, best_iterations = [], []
+    
+    for train_idx, val_idx in splits:
+        model = estimator_cls(**{
+            **base_params,
+            **params,
+            'early_stopping_rounds': EARLY_STOPPING_ROUNDS,
+            'n_jobs': 1  # Parallelism comes from running parameter sets side by side
+        })
+        model.fit(X[train_idx], y[train_idx], eval_set=[(X[val_idx], y[val_idx])], verbose=False)
+        scores.append(model.best_score)
+        best_iterations.append(model.best_iteration + 1)
+    
+    return {
+        'params': params,
+        'score': float(np.mean(scores)),
+        'n_estimators': int(np.mean(best_iterations)),
+        'seconds': time.perf_counter() - started
+    }
+
+def tune_hyperparameters(X, y, estimator_cls=XGBRegressor, base_params=MODEL_PARAMS,
+                         n_splits=CV_SPLITS, n_jobs=-1):
+    """Grid search with time-series CV, running parameter sets in parallel across cores.
+
+    X and y must be ordered by game date (oldest first). Candidates are ranked by the
+    validation eval_metric of base_params (lower is better).
+    """
+    started = time.perf_counter()
+    splits = list(TimeSeriesSplit(n_splits=n_splits).split(X))
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_params)(estimator_cls, base_params, params, X, y, splits)
+        for params in ParameterGrid(PARAM_GRID)
+    )
+    best = min(results, key=lambda result: result['score'])
+    
+    report = {
+        'best_params': {**best['params'], 'n_estimators': best['n_estimators']},
+        'metric': base_params['eval_metric'],
+        'best_score': best['score'],
+        'results': sorted(results, key=lambda result: result['score']),
+        'n_candidates': len(results),
+        'cv_splits': n_splits,
+        'seconds': time.perf_counter() - started
+    }
+    logging.info(f"Tuned {len(results)} parameter sets in {report['seconds']:.1f}s - "
+                 f"best {base_params['eval_metric']} {best['score']:.3f} with {report['best_params']}")
+    return report
+
+def train_prediction_models(tune=False):
     """Train and evaluate NBA prediction models"""
     try:
         logging.info("Starting model training process")
         df = prepare_training_features()
         
-        X = df[PRIMARY_FEATURES]
-        y_winner = df['home_win']
-        y_total = df['total_points']
+        # Build the feature matrix once as a contiguous float32 buffer in date order;
+        # every split below is a view into it, shared by both targets
+        ordered = df.sort_values('game_date', kind='stable')
+        X = np.ascontiguousarray(ordered[PRIMARY_FEATURES].to_numpy(dtype=np.float32))
+        y_winner = ordered['home_win'].to_numpy(dtype=np.int8)
+        y_total = ordered['total_points'].to_numpy(dtype=np.float32)
+        validation_start, test_start = time_ordered_bounds(len(X))
+        logging.info(f"Feature matrix: {X.shape[0]} rows x {X.shape[1]} features, "
+                     f"{X.nbytes / 1024 ** 2:.2f} MB float32")
         
-        # Split and scale data
-        X_train, X_test, y_train_winner, y_test_winner = train_test_split(X, y_winner, test_size=0.2, random_state=42)
-        _, _, y_train_total, y_test_total = train_test_split(X, y_total, test_size=0.2, random_state=42)
+        winner_params, total_params = WINNER_PARAMS, MODEL_PARAMS
+        tuning = None
+        if tune:
+            # Tune on everything before the test set
+            logging.info("Tuning winner prediction model")
+            winner_tuning = tune_hyperparameters(
+                X[:test_start], y_winner[:test_start], XGBClassifier, WINNER_PARAMS
+            )
+            logging.info("Tuning total points model")
+            total_tuning = tune_hyperparameters(X[:test_start], y_total[:test_start])
+            winner_params = {**WINNER_PARAMS, **winner_tuning['best_params']}
+            total_params = {**MODEL_PARAMS, **total_tuning['best_params']}
+            tuning = {'winner': winner_tuning, 'total': total_tuning}
         
+        # Fit the scaler on the training range and scale the whole buffer in place
         scaler = StandardScaler()
-        X_train_scaled = scaler.fit_transform(X_train)
-        X_test_scaled = scaler.transform(X_test)
+        scaler.fit(X[:validation_start])
+        X -= scaler.mean_.astype(np.float32)
+        X /= scaler.scale_.astype(np.float32)
+        X_train, X_val, X_test_scaled = X[:validation_start], X[validation_start:test_start], X[test_start:]
+        y_test_winner = y_winner[test_start:]
+        y_test_total = y_total[test_start:]
         
-        # Train models
-        logging.info("Training winner prediction model")
-        winner_model = XGBRegressor(**MODEL_PARAMS)
-        winner_model.fit(X_train_scaled, y_train_winner)
+        # Train both models concurrently (XGBoost releases the GIL), splitting the threads
+        threads_per_model = max(1, N_JOBS // 2)
+        logging.info("Training winner and total points models")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            winner_future = executor.submit(
+                fit_with_early_stopping, "Winner", XGBClassifier, {**winner_params, 'n_jobs': threads_per_model},
+                X_train, y_winner[:validation_start], X_val, y_winner[validation_start:test_start]
+            )
+            total_future = executor.submit(
+                fit_with_early_stopping, "Total points", XGBRegressor, {**total_params, 'n_jobs': threads_per_model},
+                X_train, y_total[:validation_start], X_val, y_total[validation_start:test_start]
+            )
+            winner_model, winner_stats = winner_future.result()
+            total_model, total_stats = total_future.result()
+        training_seconds = time.perf_counter() - started
+        logging.info(f"Trained both models in {training_seconds:.2f}s wall-clock")
         
-        logging.info("Training total points model")
-        total_model = XGBRegressor(**MODEL_PARAMS)
-        total_model.fit(X_train_scaled, y_train_total)
+        # Calibrate winner probabilities on the validation range
+        winner_calibrator = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip')
+        winner_calibrator.fit(winner_model.predict_proba(X_val)[:, 1], y_winner[validation_start:test_start])
         
         # Evaluate performance
-        winner_metrics, winner_preds = evaluate_model(winner_model, X_test_scaled, y_test_winner, True)
+        winner_metrics, winner_preds = evaluate_model(
+            winner_model, X_test_scaled, y_test_winner, True, winner_calibrator
+        )
         total_metrics, total_preds = evaluate_model(total_model, X_test_scaled, y_test_total, False)
         
+        # The newest games matter most for serving, so refit on every row with the
+        # early-stopped tree counts; the buffer is unscaled and rescaled in place
+        X *= scaler.scale_.astype(np.float32)
+        X += scaler.mean_.astype(np.float32)
+        scaler = StandardScaler()
+        scaler.fit(X)
+        X -= scaler.mean_.astype(np.float32)
+        X /= scaler.scale_.astype(np.float32)
+        
+        logging.info(f"Refitting both models on all {len(X)} games")
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            winner_future = executor.submit(
+                fit_final, XGBClassifier, {**winner_params, 'n_jobs': threads_per_model},
+                winner_stats['trees_used'], X, y_winner
+            )
+            total_future = executor.submit(
+                fit_final, XGBRegressor, {**total_params, 'n_jobs': threads_per_model},
+                total_stats['trees_used'], X, y_total
+            )
+            winner_model = winner_future.result()
+            total_model = total_future.result()
+        refit_seconds = time.perf_counter() - started
+        logging.info(f"Refit both models in {refit_seconds:.2f}s wall-clock")
+        
+        # The validation calibrator only fits the early-stopped model's scores, so the
+        # refit model is calibrated on cross-fitted predictions with the same settings
+        started = time.perf_counter()
+        oof_probabilities, oof_labels = cross_fit_probabilities(
+            {**winner_params, 'n_jobs': N_JOBS}, winner_stats['trees_used'], X, y_winner
+        )
+        winner_calibrator = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds='clip')
+        winner_calibrator.fit(oof_probabilities, oof_labels)
+        calibration_seconds = time.perf_counter() - started
+        logging.info(f"Calibrated the refit winner model on {len(oof_labels)} out-of-fold predictions "
+                     f"in {calibration_seconds:.2f}s")
+        
         # Get feature importance
         winner_importance = dict(zip(PRIMARY_FEATURES, winner_model.feature_importances_))
         total_importance = dict(zip(PRIMARY_FEATURES, total_model.feature_importances_))
@@ -89,16 +291,32 @@ def train_prediction_models():
             
         model_data = {
             'winner_model': winner_model,
+            'winner_calibrator': winner_calibrator,
             'total_model': total_model,
             'scaler': scaler,
             'feature_columns': PRIMARY_FEATURES,
+            # Measured on the held-out test range, before the refit on all rows
             'winner_metrics': winner_metrics,
             'total_metrics': total_metrics,
             'feature_importance': {
                 'winner': winner_importance,
                 'total': total_importance
             },
-            'params': MODEL_PARAMS,
+            'params': {
+                'winner': winner_params,
+                'total': total_params
+            },
+            'tuning': tuning,
+            'training_stats': {
+                'winner': winner_stats,
+                'total': total_stats,
+                'wall_seconds': training_seconds,
+                'refit_seconds': refit_seconds,
+                'refit_rows': len(X),
+                'calibration_seconds': calibration_seconds,
+                'calibration_rows': len(oof_labels),
+                'feature_matrix_mb': X.nbytes / 1024 ** 2
+            },
             'training_date': pd.Timestamp.now()
         }
         
@@ -106,6 +324,21 @@ def train_prediction_models():
         joblib.dump(model_data, model_path)
         logging.info(f"Models saved to {model_path}")
         
+        # Slim bundle the app and batch jobs load for inference
+        export_inference_bundle(
+            winner_model, winner_calibrator, total_model, scaler, PRIMARY_FEATURES,
+            metadata={'training_date': model_data['training_date']}
+        )
+        logging.info(f"Inference bundle saved to {BUNDLE_DIR}")
+
+        # Both bundles must score the same raw rows alike; X holds scaled values here
+        parity = check_bundle_parity(X[test_start:] * scaler.scale_ + scaler.mean_)
+        for output, difference in parity.items():
+            if difference > PARITY_TOLERANCE[output]:
+                logging.warning(f"Inference bundle and joblib artifact disagree on {output} by up to {difference:.6f}")
+        logging.info(f"Bundle parity - max win probability diff: {parity['win_probability']:.2e}, "
+                     f"max total points diff: {parity['total_points']:.2e}")
+        
         return winner_model, total_model
         
     except Exception as e:
@@ -121,4 +354,8 @@ if __name__ == "__main__":
             logging.StreamHandler()
         ]
     )
-    winner_model, total_model = train_prediction_models()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the NBA prediction models")
+    parser.add_argument("--tune", action="store_true",
+                        help="run a time-series CV grid search before training")
+    args = parser.parse_args()
+    winner_model, total_model = train_prediction_models(tune=args.tune)
\ No newline at end of file
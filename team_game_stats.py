@@ -0,0 +1,168 @@
+import psycopg2
+from psycopg2 import Error
+import os
+from dotenv import load_dotenv
+import argparse
+import time
+
+# Team box score totals per game, summed from the player rows in one pass.
+# {game_filter} selects which player rows are aggregated.
+TEAM_GAME_STATS_QUERY = '''
+INSERT INTO team_game_stats
+(game_id, team_id, points, field_goals_made, field_goals_attempted,
+three_points_made, three_points_attempted, free_throws_made, free_throws_attempted,
+total_rebounds, assists, steals, blocks, turnovers)
+SELECT
+    p.game_id,
+    p.team_id,
+    SUM(p.points),
+    SUM(p.field_goals_made),
+    SUM(p.field_goals_attempted),
+    SUM(p.three_points_made),
+    SUM(p.three_points_attempted),
+    SUM(p.free_throws_made),
+    SUM(p.free_throws_attempted),
+    SUM(p.rebounds),
+    SUM(p.assists),
+    SUM(p.steals),
+    SUM(p.blocks),
+    SUM(p.turnovers)
+FROM player_game_stats p
+{game_filter}
+GROUP BY p.game_id, p.team_id
+ON CONFLICT (game_id, team_id) DO UPDATE
+SET points = EXCLUDED.points,
+    field_goals_made = EXCLUDED.field_goals_made,
+    field_goals_attempted = EXCLUDED.field_goals_attempted,
+    three_points_made = EXCLUDED.three_points_made,
+    three_points_attempted = EXCLUDED.three_points_attempted,
+    free_throws_made = EXCLUDED.free_throws_made,
+    free_throws_attempted = EXCLUDED.free_throws_attempted,
+    total_rebounds = EXCLUDED.total_rebounds,
+    assists = EXCLUDED.assists,
+    steals = EXCLUDED.steals,
+    blocks = EXCLUDED.blocks,
+    turnovers = EXCLUDED.turnovers;
+'''
+
+# Games averaged into each team's trailing rates
+TRAILING_GAMES = 10
+
+# Each team's off_rtg, pace and true shooting averaged over its previous
+# TRAILING_GAMES completed games, so a row only reflects what was known before
+# tip-off. One extra row per team, dated after its last game and without a
+# game_id, holds the rates its next game will see. step_2 trains on the game
+# rows and serving_features stores the next-game rows, so both read one definition.
+TRAILING_RATES_QUERY = f'''
+SELECT
+    team_id,
+    game_id,
+    game_date,
+    COUNT(off_rtg) OVER previous_games AS games,
+    MAX(game_date) OVER previous_games AS as_of_date,
+    AVG(off_rtg) OVER previous_games AS off_rtg,
+    AVG(possessions) OVER previous_games AS pace,
+    AVG(true_shooting) OVER previous_games AS ts_pct
+FROM (
+    SELECT
+        tgs.team_id,
+        tgs.game_id,
+        g.game_date,
+        100.0 * tgs.points / NULLIF(tgs.field_goals_attempted + 0.44 * tgs.free_throws_attempted - tgs.total_rebounds * 0.3 + tgs.turnovers, 0) AS off_rtg,
+        (tgs.field_goals_attempted + 0.44 * tgs.free_throws_attempted - tgs.total_rebounds * 0.3 + tgs.turnovers) AS possessions,
+        tgs.points::float / (2 * NULLIF(tgs.field_goals_attempted + 0.44 * tgs.free_throws_attempted, 0)) AS true_shooting
+    FROM team_game_stats tgs
+    JOIN games g ON g.game_id = tgs.game_id
+    WHERE g.home_team_score IS NOT NULL
+    UNION ALL
+    SELECT team_id, NULL, 'infinity'::date, NULL, NULL, NULL
+    FROM teams
+) team_games
+WINDOW previous_games AS (
+    PARTITION BY team_id ORDER BY game_date, game_id
+    ROWS BETWEEN {TRAILING_GAMES} PRECEDING AND 1 PRECEDING
+)
+'''
+
+# Only (game, team) pairs that have no totals yet
+MISSING_FILTER = '''
+WHERE NOT EXISTS (
+    SELECT 1 FROM team_game_stats t
+    WHERE t.game_id = p.game_id AND t.team_id = p.team_id
+)
+'''
+
+def create_team_game_stats_table(cursor):
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS team_game_stats (
+        game_id VARCHAR(20) REFERENCES games(game_id),
+        team_id INTEGER REFERENCES teams(team_id),
+        points INTEGER,
+        field_goals_made INTEGER,
+        field_goals_attempted INTEGER,
+        three_points_made INTEGER,
+        three_points_attempted INTEGER,
+        free_throws_made INTEGER,
+        free_throws_attempted INTEGER,
+        total_rebounds INTEGER,
+        assists INTEGER,
+        steals INTEGER,
+        blocks INTEGER,
+        turnovers INTEGER,
+        PRIMARY KEY (game_id, team_id)
+    );
+
+    -- The primary key serves game_id lookups; this one serves per-team history
+    CREATE INDEX IF NOT EXISTS idx_team_game_stats_team_game ON team_game_stats (team_id, game_id);
+    ''')
+
+def update_team_game_stats(cursor, game_ids=None, rebuild=False):
+    """Aggregate player_game_stats into team_game_stats.
+
+    With game_ids, those games are recomputed (e.g. right after their player
+    rows were upserted); otherwise only games without totals are added, or
+    every game if rebuild is set.
+    """
+    if game_ids is not None:
+        cursor.execute(
+            TEAM_GAME_STATS_QUERY.format(game_filter="WHERE p.game_id = ANY(%(game_ids)s)"),
+            {'game_ids': [str(game_id) for game_id in game_ids]}
+        )
+    else:
+        cursor.execute(TEAM_GAME_STATS_QUERY.format(game_filter="" if rebuild else MISSING_FILTER))
+    return cursor.rowcount
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate player box scores into team_game_stats")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute every game instead of only games without team totals")
+    args = parser.parse_args()
+
+    connection = None
+    cursor = None
+    try:
+        load_dotenv()
+        connection = psycopg2.connect(
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            host=os.getenv("DB_HOST", "localhost"),
+            port=os.getenv("DB_PORT", "5432"),
+            database="nba_stats"
+        )
+        cursor = connection.cursor()
+
+        started = time.perf_counter()
+        create_team_game_stats_table(cursor)
+        rows = update_team_game_stats(cursor, rebuild=args.rebuild)
+        connection.commit()
+        print(f"Wrote {rows} team_game_stats rows in {time.perf_counter() - started:.2f}s")
+
+    except (Exception, Error) as error:
+        print(f"Error: {error}")
+        if connection:
+            connection.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
@@ -0,0 +1,30 @@
+from nba_api.stats.static import teams
+from functools import lru_cache
+from types import MappingProxyType
+
+@lru_cache(maxsize=1)
+def get_team_index():
+    """Build the immutable team_id -> team info index (built once, then shared)"""
+    return MappingProxyType({
+        team['id']: MappingProxyType(dict(team))
+        for team in teams.get_teams()
+    })
+
+@lru_cache(maxsize=1)
+def get_valid_team_ids():
+    """Get the set of all NBA team IDs"""
+    return frozenset(get_team_index())
+
+def get_team(team_id):
+    """Get the full team record (full_name, abbreviation, city, ...) for a team ID"""
+    return get_team_index().get(int(team_id))
+
+def get_team_name(team_id):
+    """Get team name from team ID"""
+    team = get_team(team_id)
+    return team['full_name'] if team else None
+
+@lru_cache(maxsize=1)
+def get_team_slots():
+    """Map each team ID to a fixed slot (0-29, in team ID order) for dense per-team arrays"""
+    return MappingProxyType({team_id: slot for slot, team_id in enumerate(sorted(get_team_index()))})
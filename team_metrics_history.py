@@ -0,0 +1,138 @@
+import psycopg2
+from psycopg2 import Error
+import os
+from dotenv import load_dotenv
+import argparse
+import time
+
+# Point-in-time metrics for every team on every date it played, using only the
+# games before that date within the same season (same definitions as update_metrics).
+# Seasons are keyed by the season digits of game_id, since the season label differs
+# between loaders.
+#
+# Incremental runs start from the watermark: the last game date that already has
+# metrics. Only games from that date on are windowed, plus each team's last 10
+# earlier games as lookback, and only dates from the watermark on are written.
+HISTORY_QUERY = '''
+WITH watermark AS (
+    SELECT MAX(game_date) AS max_date,
+           COALESCE(MAX(game_date), '-infinity'::date) AS since
+    FROM (
+        -- Walks the game_date index backwards and stops at the first materialized game
+        SELECT g.game_date
+        FROM games g
+        JOIN team_metrics tm ON tm.team_id = g.home_team_id AND tm.date = g.game_date
+        WHERE NOT %(rebuild)s
+        ORDER BY g.game_date DESC
+        LIMIT 1
+    ) last_materialized
+),
+all_team_games AS NOT MATERIALIZED (
+    SELECT home_team_id AS team_id, game_date, substring(game_id, 4, 2) AS season_code,
+           TRUE AS is_home, home_team_score AS points,
+           CASE WHEN home_team_score > away_team_score THEN 1 ELSE 0 END AS win
+    FROM games
+    WHERE home_team_score IS NOT NULL
+    UNION ALL
+    SELECT away_team_id AS team_id, game_date, substring(game_id, 4, 2) AS season_code,
+           FALSE AS is_home, away_team_score AS points,
+           CASE WHEN away_team_score > home_team_score THEN 1 ELSE 0 END AS win
+    FROM games
+    WHERE home_team_score IS NOT NULL
+),
+team_games AS (
+    SELECT atg.*
+    FROM all_team_games atg
+    WHERE atg.game_date >= (SELECT since FROM watermark)
+    UNION ALL
+    -- Lookback: the last 10 games of each team before the watermark
+    SELECT lookback.*
+    FROM watermark w
+    CROSS JOIN teams t
+    CROSS JOIN LATERAL (
+        SELECT atg.*
+        FROM all_team_games atg
+        WHERE atg.team_id = t.team_id AND atg.game_date < w.max_date
+        ORDER BY atg.game_date DESC
+        LIMIT 10
+    ) lookback
+    WHERE w.max_date IS NOT NULL
+),
+rolling AS (
+    SELECT
+        team_id,
+        game_date AS date,
+        COALESCE(SUM(win) OVER last_5, 0) AS last_5_wins,
+        COALESCE(SUM(win) OVER last_10, 0) AS last_10_wins,
+        COALESCE(ROUND(
+            (SUM(CASE WHEN is_home THEN win ELSE 0 END) OVER last_10)::numeric
+            / NULLIF(SUM(CASE WHEN is_home THEN 1 ELSE 0 END) OVER last_10, 0), 3), 0) AS home_win_pct,
+        COALESCE(ROUND(
+            (SUM(CASE WHEN is_home THEN 0 ELSE win END) OVER last_10)::numeric
+            / NULLIF(SUM(CASE WHEN is_home THEN 0 ELSE 1 END) OVER last_10, 0), 3), 0) AS away_win_pct,
+        COALESCE(ROUND((AVG(points) OVER last_10)::numeric, 2), 0) AS points_scored_avg,
+        -- Rest days between the last two games before this date
+        COALESCE(LAG(game_date, 1) OVER by_date - LAG(game_date, 2) OVER by_date, 0) AS rest_days
+    FROM team_games
+    WINDOW
+        by_date AS (PARTITION BY team_id, season_code ORDER BY game_date),
+        last_5 AS (PARTITION BY team_id, season_code ORDER BY game_date ROWS BETWEEN 5 PRECEDING AND 1 PRECEDING),
+        last_10 AS (PARTITION BY team_id, season_code ORDER BY game_date ROWS BETWEEN 10 PRECEDING AND 1 PRECEDING)
+)
+INSERT INTO team_metrics
+(team_id, date, last_5_wins, last_10_wins,
+points_scored_avg, home_win_pct, away_win_pct, rest_days)
+SELECT r.team_id, r.date, r.last_5_wins, r.last_10_wins,
+       r.points_scored_avg, r.home_win_pct, r.away_win_pct, r.rest_days
+FROM rolling r
+WHERE r.date >= (SELECT since FROM watermark)
+ON CONFLICT (team_id, date) DO UPDATE
+SET last_5_wins = EXCLUDED.last_5_wins,
+    last_10_wins = EXCLUDED.last_10_wins,
+    points_scored_avg = EXCLUDED.points_scored_avg,
+    home_win_pct = EXCLUDED.home_win_pct,
+    away_win_pct = EXCLUDED.away_win_pct,
+    rest_days = EXCLUDED.rest_days;
+'''
+
+def update_team_metrics_history(rebuild=False):
+    """Materialize per-team, per-game-date metrics into team_metrics.
+
+    By default only dates from the last materialized game date on are
+    (re)written; games backfilled before that date need rebuild. The
+    UNIQUE(team_id, date) index serves as-of joins.
+    """
+    connection = None
+    cursor = None
+    try:
+        load_dotenv()
+        connection = psycopg2.connect(
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            host=os.getenv("DB_HOST", "localhost"),
+            port=os.getenv("DB_PORT", "5432"),
+            database="nba_stats"
+        )
+        cursor = connection.cursor()
+
+        started = time.perf_counter()
+        cursor.execute(HISTORY_QUERY, {'rebuild': rebuild})
+        connection.commit()
+        print(f"Wrote {cursor.rowcount} team_metrics rows in {time.perf_counter() - started:.1f}s")
+
+    except (Exception, Error) as error:
+        print(f"Error: {error}")
+        if connection:
+            connection.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if connection:
+            connection.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Materialize point-in-time team metrics for every game date")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="recompute every date instead of only dates from the last materialized one")
+    args = parser.parse_args()
+    update_team_metrics_history(rebuild=args.rebuild)
@@ -1,18 +1,22 @@
-from nba_api.stats.endpoints import scoreboardv2
 import psycopg2
 from psycopg2 import Error
 import os
 from dotenv import load_dotenv
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+from api_config import print_api_stats
+from scoreboard import fetch_scoreboards
 
-def update_upcoming_games():
+# Days of games stored, starting today; matches the days the index view shows
+UPCOMING_DAYS = 3
+
+def update_upcoming_games(days=UPCOMING_DAYS):
     connection = None
     cursor = None
     try:
         # Get upcoming games from NBA API
-        games = scoreboardv2.ScoreboardV2()
-        games_df = games.game_header.get_data_frame()
+        dates = [datetime.now() + timedelta(days=day) for day in range(days)]
+        games_df, _ = fetch_scoreboards(dates)
 
         # Database connection
         load_dotenv()
@@ -64,4 +68,5 @@ def update_upcoming_games():
             connection.close()
 
 if __name__ == "__main__":
-    update_upcoming_games()
\ No newline at end of file
+    update_upcoming_games()
+    print_api_stats()
\ No newline at end of file
@@ -1,13 +1,21 @@
 # her gun bu scripti calistir
 # bu scriptin gorevi nba_api ile gunun oyunlarini cekmek ve database'e eklemek
 
-from nba_api.stats.endpoints import scoreboardv2, boxscoresummaryv2, boxscoretraditionalv2
 import psycopg2
 from psycopg2 import Error
 import os
 from dotenv import load_dotenv
 import pandas as pd
 from datetime import datetime, timedelta
+from prediction_store import init_store, record_results
+from scoreboard import fetch_scoreboard_range
+from nba_fetcher import fetch_box_scores
+from api_config import print_api_stats
+from matchup_stats import create_matchup_stats_table, update_matchup
+from team_game_stats import create_team_game_stats_table, update_team_game_stats
+from schema_migrations import ensure_season_partitions
+from seasons import season_label
+import argparse
 
 def convert_minutes_to_int(minutes_str):
     """Convert minutes from various formats to integer minutes"""
@@ -33,19 +41,18 @@ def safe_int_convert(value, default=0):
     except:
         return default
 
-def update_completed_games():
-    """Update database with completed games from yesterday"""
+def update_completed_games(days=1):
+    """Update database with completed games from the last `days` days (default: yesterday)"""
     connection = None
     cursor = None
     try:
-        # Get yesterday's completed games
+        # Get completed games, fetching every date of a backfill concurrently
         yesterday = datetime.now() - timedelta(days=1)
-        games = scoreboardv2.ScoreboardV2(game_date=yesterday.strftime('%Y-%m-%d'))
-        games_df = games.game_header.get_data_frame()
-        completed_games = games_df[games_df['GAME_STATUS_TEXT'] == 'Final']
+        games_df, line_scores = fetch_scoreboard_range(yesterday - timedelta(days=days - 1), yesterday)
+        completed_games = games_df[games_df['GAME_STATUS_TEXT'] == 'Final'] if not games_df.empty else games_df
 
         if completed_games.empty:
-            print("No completed games found for yesterday")
+            print("No completed games found")
             return
 
         # Database connection
@@ -58,14 +65,19 @@ def update_completed_games():
             database="nba_stats"
         )
         cursor = connection.cursor()
+        create_matchup_stats_table(cursor)
+        create_team_game_stats_table(cursor)
+        ensure_season_partitions(cursor, completed_games['SEASON'].astype(str).unique())
+        connection.commit()
+        final_scores = []
+
+        # Fetch all box scores up front, concurrently and through the on-disk cache
+        box_scores = fetch_box_scores(completed_games['GAME_ID'].tolist())
 
         for _, game in completed_games.iterrows():
             try:
-                # Get game details and scores
-                box_score = boxscoresummaryv2.BoxScoreSummaryV2(game_id=game['GAME_ID'])
-                line_score = box_score.line_score.get_data_frame()
-                
-                # Get home and away team scores
+                # Get home and away team scores from the scoreboard line scores
+                line_score = line_scores[line_scores['GAME_ID'] == game['GAME_ID']]
                 home_score = line_score[line_score['TEAM_ID'] == int(game['HOME_TEAM_ID'])]['PTS'].iloc[0]
                 away_score = line_score[line_score['TEAM_ID'] == int(game['VISITOR_TEAM_ID'])]['PTS'].iloc[0]
 
@@ -87,12 +99,16 @@ def update_completed_games():
                     int(game['VISITOR_TEAM_ID']),
                     int(home_score),
                     int(away_score),
-                    str(game['SEASON'])
+                    season_label(game['SEASON'])
                 ))
 
+                # Keep the head-to-head index current for this pairing
+                update_matchup(cursor, game['HOME_TEAM_ID'], game['VISITOR_TEAM_ID'])
+
                 # Get and update player statistics
-                traditional_box_score = boxscoretraditionalv2.BoxScoreTraditionalV2(game_id=game['GAME_ID'])
-                player_stats = traditional_box_score.player_stats.get_data_frame()
+                if game['GAME_ID'] not in box_scores:
+                    raise ValueError("box score unavailable")
+                player_stats = box_scores[game['GAME_ID']]
 
                 for _, player in player_stats.iterrows():
                     update_player_stats_query = '''
@@ -146,6 +162,11 @@ def update_completed_games():
                 )
 
                 connection.commit()
+                final_scores.append({
+                    'game_id': game['GAME_ID'],
+                    'home_score': int(home_score),
+                    'away_score': int(away_score)
+                })
                 print(f"Game {game['GAME_ID']} and its stats updated successfully")
 
             except Exception as e:
@@ -153,6 +174,16 @@ def update_completed_games():
                 connection.rollback()
                 continue
 
+        # Derive team box totals for the loaded games in one set-based statement
+        if final_scores:
+            update_team_game_stats(cursor, game_ids=[score['game_id'] for score in final_scores])
+            connection.commit()
+
+        # Reconcile actual results into the stored predictions
+        init_store()
+        reconciled = record_results(final_scores)
+        print(f"Reconciled {reconciled} stored predictions")
+
     except Exception as error:
         print(f"Error: {error}")
         if connection:
@@ -164,4 +195,9 @@ def update_completed_games():
             connection.close()
 
 if __name__ == "__main__":
-    update_completed_games()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load completed games into the database")
+    parser.add_argument("--days", type=int, default=1,
+                        help="number of days to backfill, ending yesterday")
+    args = parser.parse_args()
+    update_completed_games(days=args.days)
+    print_api_stats()
\ No newline at end of file
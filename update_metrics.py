@@ -5,9 +5,22 @@ import os
 from dotenv import load_dotenv
 import pandas as pd
 from datetime import datetime, timedelta
+from team_index import get_valid_team_ids
+from api_config import call_endpoint, print_api_stats
+from psycopg2.extras import execute_values
+from seasons import season_code
+import argparse
 
-def calculate_team_metrics(team_id, date):
-    team_log = teamgamelog.TeamGameLog(team_id=team_id, season='2023-24')
+DEFAULT_SEASON = "2024-25"
+
+METRIC_COLUMNS = [
+    'last_5_wins', 'last_10_wins', 'points_scored_avg',
+    'home_games', 'home_wins', 'away_games', 'away_wins', 'rest_days'
+]
+
+def calculate_team_metrics(team_id, date, season=DEFAULT_SEASON):
+    """Calculate metrics for a single team from its TeamGameLog (one API call per team)"""
+    team_log = call_endpoint(teamgamelog.TeamGameLog, team_id=team_id, season=season)
     games_df = team_log.get_data_frames()[0]
     
     games_df['GAME_DATE'] = pd.to_datetime(games_df['GAME_DATE'], format='mixed')
@@ -43,7 +56,67 @@ def calculate_team_metrics(team_id, date):
     
     return metrics
 
-def update_team_metrics():
+def load_league_game_log(cursor, season):
+    """Load the season's completed games from our games table as one row per team per game"""
+    # Select by the season digits of the game ID: the season label differs between loaders
+    cursor.execute('''
+    SELECT game_date, home_team_id, away_team_id, home_team_score, away_team_score
+    FROM games
+    WHERE substring(game_id, 4, 2) = %s AND home_team_score IS NOT NULL
+    ''', (season_code(season),))
+    games = pd.DataFrame(cursor.fetchall(), columns=[
+        'game_date', 'home_team_id', 'away_team_id', 'home_team_score', 'away_team_score'
+    ])
+
+    home = pd.DataFrame({
+        'team_id': games['home_team_id'],
+        'game_date': games['game_date'],
+        'is_home': True,
+        'points': games['home_team_score'],
+        'win': games['home_team_score'] > games['away_team_score']
+    })
+    away = pd.DataFrame({
+        'team_id': games['away_team_id'],
+        'game_date': games['game_date'],
+        'is_home': False,
+        'points': games['away_team_score'],
+        'win': games['away_team_score'] > games['home_team_score']
+    })
+    game_log = pd.concat([home, away], ignore_index=True)
+    game_log['game_date'] = pd.to_datetime(game_log['game_date'])
+    return game_log
+
+def calculate_league_metrics(game_log, date):
+    """Calculate metrics for every team in one grouped pass (same definitions as calculate_team_metrics)"""
+    target_date = pd.to_datetime(date).normalize()
+
+    # Last 10 games before the target date for each team, most recent first
+    past_games = game_log[game_log['game_date'] < target_date]
+    past_games = past_games.sort_values(['team_id', 'game_date'], ascending=[True, False])
+    past_games = past_games.groupby('team_id').head(10).copy()
+    past_games['recency'] = past_games.groupby('team_id').cumcount()
+
+    by_team = past_games.groupby('team_id')
+    home_games = past_games['is_home']
+    last_game = past_games[past_games['recency'] == 0].set_index('team_id')['game_date']
+    previous_game = past_games[past_games['recency'] == 1].set_index('team_id')['game_date']
+
+    metrics = pd.DataFrame({
+        'last_5_wins': past_games[past_games['recency'] < 5].groupby('team_id')['win'].sum(),
+        'last_10_wins': by_team['win'].sum(),
+        'points_scored_avg': by_team['points'].mean(),
+        'home_games': home_games.groupby(past_games['team_id']).sum(),
+        'home_wins': (home_games & past_games['win']).groupby(past_games['team_id']).sum(),
+        'away_games': (~home_games).groupby(past_games['team_id']).sum(),
+        'away_wins': (~home_games & past_games['win']).groupby(past_games['team_id']).sum(),
+        'rest_days': (last_game - previous_game).dt.days  # Rest days between the last two games
+    })
+
+    # Teams without games get the same zero metrics as calculate_team_metrics
+    return metrics.reindex(sorted(get_valid_team_ids()))[METRIC_COLUMNS].fillna(0)
+
+def update_team_metrics(season=DEFAULT_SEASON, per_team=False):
+    """Compute today's metrics for every team and bulk-upsert them into team_metrics"""
     connection = None
     cursor = None
     try:
@@ -57,40 +130,46 @@ def update_team_metrics():
         )
         cursor = connection.cursor()
 
-        cursor.execute("SELECT team_id FROM teams")
-        teams = cursor.fetchall()
         today = datetime.now()
         
-        for (team_id,) in teams:
-            metrics = calculate_team_metrics(team_id, today)
-            
-            insert_query = '''
-            INSERT INTO team_metrics 
-            (team_id, date, last_5_wins, last_10_wins, 
-            points_scored_avg, home_win_pct, away_win_pct, rest_days)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (team_id, date) DO UPDATE 
-            SET last_5_wins = EXCLUDED.last_5_wins,
-                last_10_wins = EXCLUDED.last_10_wins,
-                points_scored_avg = EXCLUDED.points_scored_avg,
-                home_win_pct = EXCLUDED.home_win_pct,
-                away_win_pct = EXCLUDED.away_win_pct,
-                rest_days = EXCLUDED.rest_days;
-            '''
-            
-            cursor.execute(insert_query, (
-                team_id,
+        if per_team:
+            metrics_df = pd.DataFrame.from_dict({
+                team_id: calculate_team_metrics(team_id, today, season)
+                for team_id in sorted(get_valid_team_ids())
+            }, orient='index')[METRIC_COLUMNS].fillna(0)
+        else:
+            metrics_df = calculate_league_metrics(load_league_game_log(cursor, season), today)
+        
+        rows = [
+            (
+                int(team_id),
                 today.date(),
-                metrics['last_5_wins'],
-                metrics['last_10_wins'],
+                int(metrics['last_5_wins']),
+                int(metrics['last_10_wins']),
                 round(float(metrics['points_scored_avg']), 2),
                 round(metrics['home_wins'] / metrics['home_games'] if metrics['home_games'] > 0 else 0, 3),
                 round(metrics['away_wins'] / metrics['away_games'] if metrics['away_games'] > 0 else 0, 3),
                 round(float(metrics['rest_days']), 1)
-            ))
-            
-            connection.commit()
-            print(f"Updated metrics for team {team_id}")
+            )
+            for team_id, metrics in metrics_df.iterrows()
+        ]
+        
+        insert_query = '''
+        INSERT INTO team_metrics 
+        (team_id, date, last_5_wins, last_10_wins, 
+        points_scored_avg, home_win_pct, away_win_pct, rest_days)
+        VALUES %s
+        ON CONFLICT (team_id, date) DO UPDATE 
+        SET last_5_wins = EXCLUDED.last_5_wins,
+            last_10_wins = EXCLUDED.last_10_wins,
+            points_scored_avg = EXCLUDED.points_scored_avg,
+            home_win_pct = EXCLUDED.home_win_pct,
+            away_win_pct = EXCLUDED.away_win_pct,
+            rest_days = EXCLUDED.rest_days;
+        '''
+        execute_values(cursor, insert_query, rows)
+        connection.commit()
+        print(f"Updated metrics for {len(rows)} teams")
 
     except Exception as error:
         print(f"Error: {error}")
@@ -103,4 +182,11 @@ def update_team_metrics():
             connection.close()
 
 if __name__ == "__main__":
-    update_team_metrics()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Update today's team_metrics snapshot")
+    parser.add_argument("--season", default=DEFAULT_SEASON,
+                        help=f"season to compute metrics for (default {DEFAULT_SEASON})")
+    parser.add_argument("--per-team", action="store_true",
+                        help="use one TeamGameLog API call per team instead of the games table")
+    args = parser.parse_args()
+    update_team_metrics(season=args.season, per_team=args.per_team)
+    print_api_stats()
@@ -4,6 +4,7 @@ from psycopg2 import Error
 import os
 from dotenv import load_dotenv
 import pandas as pd
+from api_config import call_endpoint
 
 def update_player_teams():
     connection = None
@@ -12,7 +13,7 @@ def update_player_teams():
         load_dotenv()
         
         # NBA API'den verileri al
-        all_players = commonallplayers.CommonAllPlayers()
+        all_players = call_endpoint(commonallplayers.CommonAllPlayers)
         players_data = all_players.get_data_frames()[0]
         
         # Aktif oyuncuları filtrele